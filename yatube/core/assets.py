@@ -0,0 +1,86 @@
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from posts.models import Post
+
+# Файлы с хешем содержимого в имени не меняются никогда.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+ASSET_MAX_AGE = 60 * 60
+HASHED_STATIC_RE = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+# Готовые сжатые копии в порядке предпочтения.
+PRECOMPRESSED = (
+    ('br', '.br', re.compile(r'\bbr\b')),
+    ('gzip', '.gz', re.compile(r'\bgzip\b')),
+)
+
+
+def serve(request, path, document_root, immutable=False):
+    """
+    Отдать файл с ETag, Last-Modified и ответом 304 на условный
+    запрос. Если клиент принимает сжатие и рядом лежит .br или .gz
+    копия, отдаётся она.
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = safe_join(document_root, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(fullpath):
+        raise Http404
+    served, encoding = fullpath, None
+    accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    for name, extension, accepts in PRECOMPRESSED:
+        if accepts.search(accept_encoding) and os.path.isfile(
+            fullpath + extension
+        ):
+            served, encoding = fullpath + extension, name
+            break
+    stat = os.stat(served)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(stat.st_mtime)
+    )
+    if response is None:
+        content_type = mimetypes.guess_type(fullpath)[0]
+        response = FileResponse(open(served, 'rb'))
+        response['Content-Type'] = content_type or 'application/octet-stream'
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = (
+        IMMUTABLE_CACHE_CONTROL if immutable
+        else f'public, max-age={ASSET_MAX_AGE}'
+    )
+    return response
+
+
+def serve_static(request, path):
+    return serve(
+        request,
+        path,
+        settings.STATIC_ROOT,
+        immutable=bool(HASHED_STATIC_RE.search(path))
+    )
+
+
+def serve_media(request, path):
+    storage = Post._meta.get_field('image').storage
+    return serve(
+        request,
+        path,
+        settings.MEDIA_ROOT,
+        immutable=storage.is_blob(path) or path.startswith('posts/variants/')
+    )
@@ -0,0 +1,74 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryStats:
+    """Число SQL-запросов и их суммарное время (в секундах) за запрос."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.budget = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+    @property
+    def exceeded(self):
+        return self.budget is not None and self.count > self.budget
+
+
+def query_budget(max_queries):
+    """
+    Объявить, сколько SQL-запросов может сделать view вместе
+    с шаблоном. Проверяет QueryBudgetMiddleware.
+    """
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+class QueryBudgetMiddleware:
+    """
+    Считает запросы к базе и их время для каждого запроса
+    (request.query_stats). Если view превысило query_budget, пишет
+    предупреждение в лог, а при QUERY_BUDGET_RAISE -- падает.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = request.query_stats = QueryStats()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            stats.budget = getattr(match.func, 'query_budget', None)
+        if stats.exceeded:
+            message = (
+                f'{match.view_name}: {stats.count} SQL-запросов '
+                f'при бюджете {stats.budget} ({stats.duration * 1000:.1f} мс)'
+            )
+            if settings.QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,244 @@
+import threading
+from collections import Counter
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from . import timing
+
+MISSING = object()
+# Статистика общая для всех потоков процесса: django.core.cache.caches
+# создаёт отдельный экземпляр бэкенда в каждом потоке.
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+class TieredCache(BaseCache):
+    """
+    Двухуровневый кеш: локальный LRU процесса (L1) перед общим кешем (L2).
+
+    L1 не знает об изменениях, сделанных другими процессами, поэтому
+    записи в нём живут не дольше L1_TIMEOUT секунд, а ключи с префиксами
+    из L1_BYPASS (поколения лент, счётчики) читаются только из L2.
+
+    OPTIONS:
+        L2 -- алиас общего кеша в settings.CACHES;
+        L1_MAX_ENTRIES, L1_TIMEOUT, L1_BYPASS.
+    """
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.l2_alias = options['L2']
+        self.l1_timeout = options.get('L1_TIMEOUT', 5)
+        self.l1_bypass = tuple(options.get('L1_BYPASS', ()))
+        self.l1 = LocMemCache(f'tiered-l1-{name}', {
+            'TIMEOUT': self.l1_timeout,
+            'OPTIONS': {
+                'MAX_ENTRIES': options.get('L1_MAX_ENTRIES', 1000),
+            },
+        })
+        with _stats_lock:
+            self._stats = _stats.setdefault(name, Counter())
+
+    @property
+    def l2(self):
+        return caches[self.l2_alias]
+
+    def _count(self, **events):
+        with _stats_lock:
+            self._stats.update(events)
+
+    def stats(self):
+        """Попадания и промахи по уровням с момента запуска процесса."""
+        with _stats_lock:
+            stats = dict(self._stats)
+        return {
+            tier: {
+                'hits': stats.get(f'{tier}_hits', 0),
+                'misses': stats.get(f'{tier}_misses', 0),
+            }
+            for tier in ('l1', 'l2')
+        }
+
+    def reset_stats(self):
+        with _stats_lock:
+            self._stats.clear()
+
+    def _local(self, key):
+        return not key.startswith(self.l1_bypass)
+
+    def _l1_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self.l1_timeout
+        return min(timeout, self.l1_timeout)
+
+    def get(self, key, default=None, version=None):
+        if self._local(key):
+            value = self.l1.get(key, MISSING, version=version)
+            if value is not MISSING:
+                self._count(l1_hits=1)
+                return value
+            self._count(l1_misses=1)
+        value = self.l2.get(key, MISSING, version=version)
+        if value is MISSING:
+            self._count(l2_misses=1)
+            return default
+        self._count(l2_hits=1)
+        if self._local(key):
+            self.l1.set(key, value, self.l1_timeout, version=version)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        local = [key for key in keys if self._local(key)]
+        found = self.l1.get_many(local, version=version)
+        self._count(l1_hits=len(found), l1_misses=len(local) - len(found))
+        remote_keys = [key for key in keys if key not in found]
+        if not remote_keys:
+            return found
+        remote = self.l2.get_many(remote_keys, version=version)
+        self._count(
+            l2_hits=len(remote),
+            l2_misses=len(remote_keys) - len(remote)
+        )
+        self.l1.set_many(
+            {key: value for key, value in remote.items() if self._local(key)},
+            self.l1_timeout,
+            version=version
+        )
+        found.update(remote)
+        return found
+
+    def has_key(self, key, version=None):
+        return (
+            self._local(key) and self.l1.has_key(key, version=version)
+            or self.l2.has_key(key, version=version)
+        )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout, version=version)
+        if self._local(key):
+            self.l1.set(
+                key, value, self._l1_timeout(timeout), version=version
+            )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout, version=version)
+        if added and self._local(key):
+            self.l1.set(
+                key, value, self._l1_timeout(timeout), version=version
+            )
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version=version) or []
+        self.l1.set_many(
+            {
+                key: value for key, value in data.items()
+                if self._local(key) and key not in failed
+            },
+            self._l1_timeout(timeout),
+            version=version
+        )
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self.l1.delete(key, version=version)
+        return self.l2.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        self.l1.delete(key, version=version)
+        return self.l2.decr(key, delta, version=version)
+
+    def delete(self, key, version=None):
+        self.l1.delete(key, version=version)
+        self.l2.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.l1.delete_many(keys, version=version)
+        self.l2.delete_many(keys, version=version)
+
+    def clear(self):
+        self.l1.clear()
+        self.l2.clear()
+
+
+class TimedCache(BaseCache):
+    """
+    Обёртка над кешем OPTIONS['CACHE'], которая считает время обращений
+    и попадания для Server-Timing (core.timing). Вне подробного замера
+    только передаёт вызовы.
+    """
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        self.alias = params.get('OPTIONS', {})['CACHE']
+
+    @property
+    def target(self):
+        return caches[self.alias]
+
+    def get(self, key, default=None, version=None):
+        with timing.measure('cache'):
+            value = self.target.get(key, MISSING, version=version)
+        if value is MISSING:
+            timing.count_cache(0, 1)
+            return default
+        timing.count_cache(1, 0)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        with timing.measure('cache'):
+            found = self.target.get_many(keys, version=version)
+        timing.count_cache(len(found), len(keys) - len(found))
+        return found
+
+    def has_key(self, key, version=None):
+        with timing.measure('cache'):
+            return self.target.has_key(key, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with timing.measure('cache'):
+            self.target.set(key, value, timeout, version=version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with timing.measure('cache'):
+            return self.target.add(key, value, timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with timing.measure('cache'):
+            return self.target.set_many(data, timeout, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        with timing.measure('cache'):
+            return self.target.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        with timing.measure('cache'):
+            return self.target.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        with timing.measure('cache'):
+            return self.target.decr(key, delta, version=version)
+
+    def delete(self, key, version=None):
+        with timing.measure('cache'):
+            self.target.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        with timing.measure('cache'):
+            self.target.delete_many(keys, version=version)
+
+    def clear(self):
+        self.target.clear()
+
+    def __getattr__(self, name):
+        # stats() и reset_stats() TieredCache.
+        return getattr(self.target, name)
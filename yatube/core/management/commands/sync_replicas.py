@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.replicas import sync_sqlite_replica
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файлы реплик '
+        '(DATABASE_REPLICAS): так реплики проверяются локально.'
+    )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не настроены (DB_REPLICAS)')
+        for alias in settings.DATABASE_REPLICAS:
+            try:
+                sync_sqlite_replica(alias)
+            except ValueError as error:
+                raise CommandError(error)
+            self.stdout.write(self.style.SUCCESS(f'Реплика {alias} обновлена'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core import timing
+
+
+class Command(BaseCommand):
+    help = (
+        'Выводит гистограммы времени ответа по view из выборочных '
+        'замеров ServerTimingMiddleware. Замеры хранятся в кеше, поэтому '
+        'нужен общий для процессов кеш (CACHE_BACKEND).'
+    )
+
+    def handle(self, *args, **options):
+        histograms = timing.histograms()
+        if not histograms:
+            self.stdout.write('Замеров пока нет')
+            return
+        self.stdout.write(
+            f'{"view":<28}{"замеров":>9}{"сред., мс":>11}'
+            f'{"p50 ≤ мс":>10}{"p95 ≤ мс":>10}'
+        )
+        for name, stats in sorted(histograms.items()):
+            self.stdout.write(
+                f'{name:<28}{stats["count"]:>9}{stats["avg"]:>11}'
+                f'{stats["p50"]:>10}{stats["p95"]:>10}'
+            )
@@ -0,0 +1,187 @@
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+# Кука, с которой после записи чтения идут в основную базу, а кеши
+# не отдают прошлое поколение лент: автор должен сразу увидеть свой
+# пост. Ставится и без реплик.
+STICKY_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = threading.local()
+# {алиас реплики: время, до которого она считается недоступной}
+_unhealthy = {}
+_unhealthy_lock = threading.Lock()
+
+
+def read_replica(view):
+    """Разрешить view читать из реплики (ReplicaMiddleware)."""
+    view.read_replica = True
+    return view
+
+
+def healthy(alias):
+    """
+    Можно ли читать из реплики: соединение открывается. Недоступная
+    реплика пропускается REPLICA_RETRY_SECONDS секунд.
+    """
+    with _unhealthy_lock:
+        retry_at = _unhealthy.get(alias)
+    if retry_at is not None and retry_at > time.monotonic():
+        return False
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError:
+        with _unhealthy_lock:
+            _unhealthy[alias] = (
+                time.monotonic() + settings.REPLICA_RETRY_SECONDS
+            )
+        return False
+    with _unhealthy_lock:
+        _unhealthy.pop(alias, None)
+    return True
+
+
+def choose_replica():
+    """Случайная доступная реплика или None, если таких нет."""
+    aliases = list(settings.DATABASE_REPLICAS)
+    random.shuffle(aliases)
+    for alias in aliases:
+        if healthy(alias):
+            return alias
+    return None
+
+
+@contextmanager
+def reading_from(alias):
+    """Направить чтения в реплику alias до конца блока."""
+    previous = (
+        getattr(_state, 'replica', None), getattr(_state, 'wrote', False)
+    )
+    _state.replica, _state.wrote = alias, False
+    try:
+        yield
+    finally:
+        _state.replica, _state.wrote = previous
+
+
+@contextmanager
+def primary():
+    """
+    Читать из основной базы до конца блока. Так считается всё, что
+    кладётся в кеш по поколениям лент: реплика может отставать от них.
+    """
+    replica = getattr(_state, 'replica', None)
+    _state.replica = None
+    try:
+        yield
+    finally:
+        _state.replica = replica
+
+
+def wrote():
+    """Была ли в текущем запросе запись в базу."""
+    return getattr(_state, 'wrote', False)
+
+
+def sees_own_writes(request):
+    """
+    Должен ли запрос видеть свежие данные: браузер недавно писал
+    (кука STICKY_COOKIE) или запись была в этом же запросе.
+    """
+    return STICKY_COOKIE in request.COOKIES or wrote()
+
+
+def replica_reads():
+    """Идут ли сейчас чтения в реплику."""
+    return getattr(_state, 'replica', None) is not None and not wrote()
+
+
+class ReplicaRouter:
+    """
+    Запись всегда идёт в основную базу, чтение -- в реплику, которую
+    ReplicaMiddleware выбрал для запроса. После первой записи
+    и внутри транзакции чтения тоже идут в основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = getattr(_state, 'replica', None)
+        if replica is None or wrote():
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return replica
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # В репликах те же данные, что и в основной базе.
+        return True
+
+
+class ReplicaMiddleware:
+    """
+    Выбирает реплику для GET-запросов к view с read_replica
+    (request.db_replica). После записи в POST-запросе ставит куку
+    STICKY_COOKIE (и без реплик): следующие REPLICA_STICKY_SECONDS
+    секунд этот браузер читает из основной базы и не получает
+    из кеша прошлое поколение лент (sees_own_writes).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.db_replica = None
+        with reading_from(None):
+            response = self.get_response(request)
+            changed = wrote()
+        if changed and request.method not in SAFE_METHODS:
+            response.set_cookie(
+                STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (getattr(view_func, 'read_replica', False)
+                and request.method in SAFE_METHODS
+                and STICKY_COOKIE not in request.COOKIES
+                and settings.DATABASE_REPLICAS):
+            request.db_replica = _state.replica = choose_replica()
+
+
+def check_connections(**kwargs):
+    """
+    Проверить постоянные соединения в начале запроса, как
+    CONN_HEALTH_CHECKS в Django 4.1: оборванное соединение
+    закрывается и будет открыто заново при первом запросе к базе.
+    """
+    for connection in connections.all():
+        if (connection.connection is not None
+                and connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not connection.is_usable()):
+            connection.close()
+
+
+def sync_sqlite_replica(alias):
+    """Скопировать основную базу SQLite в файл реплики alias."""
+    source = connections[DEFAULT_DB_ALIAS]
+    if source.vendor != 'sqlite':
+        raise ValueError('Копировать можно только базу SQLite')
+    source.ensure_connection()
+    connections[alias].close()
+    target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+    try:
+        source.connection.backup(target)
+    finally:
+        target.close()
@@ -0,0 +1,13 @@
+from django.conf import settings
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """
+    Настроить новое соединение SQLite по SQLITE_PRAGMAS. Запросы идут
+    мимо курсора Django и не попадают в счётчики запросов.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        if value is not None:
+            connection.connection.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,96 @@
+import math
+import random
+import time
+
+from django.core.cache import cache
+
+from .replicas import primary
+
+# Столько секунд пересчёт держит блокировку; если не успел, значение
+# посчитает следующий запрос.
+LOCK_TIMEOUT = 10
+WAIT_INTERVAL = 0.05
+# Чем больше, тем раньше до истечения срока начинается пересчёт.
+EARLY_EXPIRY_BETA = 1.0
+STALE_TIMEOUT = 60 * 60 * 24
+
+
+def _lock_key(key):
+    return f'lock:{key}'
+
+
+def _compute(key, compute, timeout, stale_key):
+    start = time.perf_counter()
+    with primary():
+        value = compute()
+    if value is None:
+        return None
+    delta = time.perf_counter() - start
+    expires = math.inf if timeout is None else time.time() + timeout
+    cache.set(key, (value, delta, expires), timeout)
+    if stale_key is not None:
+        cache.set(stale_key, value, STALE_TIMEOUT)
+    return value
+
+
+def _wait(key):
+    # Ждём, пока пересчёт в другом запросе не положит значение в кеш
+    # или не отпустит блокировку.
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+        if not cache.has_key(_lock_key(key)):
+            break
+    return None
+
+
+def cached(key):
+    """Значение, сохранённое remember, или None; без пересчёта."""
+    entry = cache.get(key)
+    return None if entry is None else entry[0]
+
+
+def remember(key, compute, timeout, stale_key=None,
+             beta=EARLY_EXPIRY_BETA, stale_ok=True):
+    """
+    Значение из кеша или compute() без «лавины» пересчётов.
+
+    Вместе со значением хранится, сколько длился его расчёт. Незадолго
+    до истечения срока запрос с вероятностью, растущей к концу срока,
+    пересчитывает значение заранее (XFetch). Пересчитывает только тот,
+    кто взял блокировку; остальные получают старое значение -- прошлое
+    по этому ключу или последнее по stale_key (например, тот же
+    фрагмент прошлого поколения ленты) -- или ждут результата.
+    С stale_ok=False значение по stale_key не отдаётся: запрос ждёт
+    пересчёта или считает сам (например, автор только что написал пост
+    и должен его увидеть).
+    compute() читает из основной базы (core.replicas.primary), чтобы
+    отстающая реплика не попала в кеш под новым ключом. Если compute()
+    вернул None, результат не кешируется.
+    """
+    entry = cache.get(key)
+    stale = None
+    if entry is not None:
+        value, delta, expires = entry
+        # 1 - random() не бывает нулём, логарифм определён.
+        early = delta * beta * -math.log(1 - random.random())
+        if time.time() + early < expires:
+            return value
+        stale = value
+    elif stale_key is not None and stale_ok:
+        stale = cache.get(stale_key)
+    lock_key = _lock_key(key)
+    if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        if stale is not None:
+            return stale
+        value = _wait(key)
+        if value is not None:
+            return value
+        return _compute(key, compute, timeout, stale_key)
+    try:
+        return _compute(key, compute, timeout, stale_key)
+    finally:
+        cache.delete(lock_key)
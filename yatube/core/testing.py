@@ -0,0 +1,28 @@
+from django.test import override_settings
+
+
+class QueryBudgetTestMixin:
+    """
+    Проверки бюджета SQL-запросов для TestCase. Ответы тестового
+    клиента несут request.query_stats из QueryBudgetMiddleware.
+    """
+
+    def assertWithinQueryBudget(self, response):
+        stats = response.wsgi_request.query_stats
+        match = response.wsgi_request.resolver_match
+        self.assertIsNotNone(
+            stats.budget, f'{match.view_name}: бюджет запросов не объявлен'
+        )
+        self.assertLessEqual(
+            stats.count,
+            stats.budget,
+            f'{match.view_name}: {stats.count} SQL-запросов '
+            f'при бюджете {stats.budget}'
+        )
+
+    def request_within_budget(self, client, method, url, data=None):
+        # Превышение бюджета поднимает QueryBudgetExceeded прямо в тесте.
+        with override_settings(QUERY_BUDGET_RAISE=True):
+            response = getattr(client, method)(url, data)
+        self.assertWithinQueryBudget(response)
+        return response
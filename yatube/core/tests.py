@@ -0,0 +1,415 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.db import connection, connections, transaction
+from django.template.loader import get_template
+from django.test import (
+    Client,
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import ResolverMatch, reverse
+
+from core import assets, timing
+from core.budgets import (
+    QueryBudgetExceeded,
+    QueryBudgetMiddleware,
+    query_budget
+)
+from core.replicas import STICKY_COOKIE, ReplicaRouter, reading_from
+from core.stampede import remember
+from posts.cards import VARIANTS, card_key
+from posts.models import Post
+
+TEMP_ASSETS_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+REPLICA = 'replica1'
+BLOB_NAME = 'posts/ab/' + 'ab' * 32 + '.png'
+
+TIERED_CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'OPTIONS': {
+            'L2': 'shared',
+            'L1_TIMEOUT': 60,
+            'L1_BYPASS': ['feed_gen:'],
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tiered-test-l2',
+    },
+}
+
+
+@override_settings(CACHES=TIERED_CACHES)
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        self.cache = caches['default']
+        self.cache.clear()
+        self.cache.reset_stats()
+
+    def test_reads_go_through_both_tiers(self):
+        """Проверяем, что чтение идёт из L1, а при промахе -- из L2."""
+        self.cache.set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.cache.l1.clear()
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(self.cache.get_many(['key', 'missing']), {
+            'key': 'value',
+        })
+        self.assertEqual(self.cache.stats(), {
+            'l1': {'hits': 2, 'misses': 2},
+            'l2': {'hits': 1, 'misses': 1},
+        })
+
+    def test_bypass_keys_are_not_stored_locally(self):
+        """Проверяем, что ключи из L1_BYPASS хранятся только в L2."""
+        self.cache.set('feed_gen:all', 'generation')
+        self.assertIsNone(self.cache.l1.get('feed_gen:all'))
+        caches['shared'].set('feed_gen:all', 'new generation')
+        self.assertEqual(self.cache.get('feed_gen:all'), 'new generation')
+
+    def test_delete_clears_both_tiers(self):
+        """Проверяем, что удаление сбрасывает оба уровня."""
+        self.cache.set('key', 'value')
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.assertIsNone(caches['shared'].get('key'))
+
+
+@override_settings(
+    MEDIA_ROOT=os.path.join(TEMP_ASSETS_ROOT, 'media'),
+    STATIC_ROOT=os.path.join(TEMP_ASSETS_ROOT, 'static'),
+    STATICFILES_DIRS=[os.path.join(TEMP_ASSETS_ROOT, 'source')],
+    STATICFILES_STORAGE='core.storage.CompressedManifestStaticFilesStorage'
+)
+class AssetsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.factory = RequestFactory()
+        files = {
+            os.path.join('media', BLOB_NAME): b'png' * 100,
+            os.path.join('media', 'notes.txt'): b'notes',
+            os.path.join('source', 'css', 'site.css'): b'body {}\n' * 200,
+        }
+        for name, data in files.items():
+            path = os.path.join(TEMP_ASSETS_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file_:
+                file_.write(data)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_ASSETS_ROOT, ignore_errors=True)
+
+    def test_media_supports_conditional_get(self):
+        """Проверяем ETag, Last-Modified и ответ 304 для медиа."""
+        response = assets.serve_media(self.factory.get('/'), BLOB_NAME)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'png' * 100)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(
+            response['Cache-Control'], assets.IMMUTABLE_CACHE_CONTROL
+        )
+        self.assertIn('Last-Modified', response)
+        not_modified = assets.serve_media(
+            self.factory.get('/', HTTP_IF_NONE_MATCH=response['ETag']),
+            BLOB_NAME
+        )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+
+    def test_mutable_media_is_cached_briefly(self):
+        """Проверяем, что файл без хеша в имени кешируется ненадолго."""
+        response = assets.serve_media(self.factory.get('/'), 'notes.txt')
+        self.assertEqual(
+            response['Cache-Control'],
+            f'public, max-age={assets.ASSET_MAX_AGE}'
+        )
+        with self.assertRaises(assets.Http404):
+            assets.serve_media(self.factory.get('/'), '../source/css/site.css')
+
+    def test_collectstatic_builds_precompressed_copies(self):
+        """Проверяем .gz копии статики и их отдачу с Content-Encoding."""
+        call_command('collectstatic', interactive=False, verbosity=0)
+        static_root = settings.STATIC_ROOT
+        hashed = [
+            name for name in os.listdir(os.path.join(static_root, 'css'))
+            if assets.HASHED_STATIC_RE.search(name)
+        ]
+        self.assertEqual(len(hashed), 1)
+        name = 'css/' + hashed[0]
+        self.assertTrue(
+            os.path.isfile(os.path.join(static_root, name + '.gz'))
+        )
+        response = assets.serve_static(
+            self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip, deflate'), name
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(
+            response['Cache-Control'], assets.IMMUTABLE_CACHE_CONTROL
+        )
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)),
+            b'body {}\n' * 200
+        )
+        plain = assets.serve_static(self.factory.get('/'), name)
+        self.assertNotIn('Content-Encoding', plain)
+
+
+class QueryBudgetTests(TestCase):
+    @staticmethod
+    def middleware(queries):
+        @query_budget(1)
+        def view(request):
+            for _ in range(queries):
+                list(get_user_model().objects.all())
+            return HttpResponse()
+
+        def get_response(request):
+            request.resolver_match = ResolverMatch(view, (), {}, 'view')
+            return view(request)
+        return QueryBudgetMiddleware(get_response)
+
+    def test_queries_are_counted_per_request(self):
+        """Проверяем, что запросы считаются и укладываются в бюджет."""
+        request = RequestFactory().get('/')
+        self.middleware(1)(request)
+        self.assertEqual(request.query_stats.count, 1)
+        self.assertEqual(request.query_stats.budget, 1)
+        self.assertGreater(request.query_stats.duration, 0)
+
+    def test_exceeded_budget_warns_or_raises(self):
+        """Проверяем предупреждение и ошибку при превышении бюджета."""
+        with self.assertLogs('core.budgets', 'WARNING'):
+            self.middleware(2)(RequestFactory().get('/'))
+        with override_settings(QUERY_BUDGET_RAISE=True):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.middleware(2)(RequestFactory().get('/'))
+
+
+class ReplicaRouterTests(TransactionTestCase):
+    # Без транзакции TestCase: внутри неё чтения идут в основную базу.
+    def test_router_reads_replica_until_write(self):
+        """Проверяем, что после записи и в транзакции читаем из основной."""
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Post))
+        with reading_from('replica'):
+            self.assertEqual(router.db_for_read(Post), 'replica')
+            with transaction.atomic():
+                self.assertIsNone(router.db_for_read(Post))
+            self.assertEqual(router.db_for_write(Post), 'default')
+            self.assertIsNone(router.db_for_read(Post))
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaTests(TransactionTestCase):
+    # Реплика -- второе соединение с той же тестовой базой (MIRROR);
+    # без транзакции TestCase, чтобы оно видело данные теста.
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        connections.databases[REPLICA] = {
+            **connections['default'].settings_dict,
+            'TEST': {'MIRROR': 'default'},
+        }
+        connections.ensure_defaults(REPLICA)
+        connections.prepare_test_settings(REPLICA)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='reader')
+        self.post = Post.objects.create(author=self.user, text='Пост')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def get(self, client, url):
+        with CaptureQueriesContext(connections['default']) as default, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = client.get(url)
+        return response, len(default), len(replica)
+
+    def test_get_reads_replica_without_caching(self):
+        """
+        Проверяем, что GET без куки читает из реплики и не кладёт
+        прочитанное в кеш, а с кукой читает из основной базы и кладёт.
+        """
+        response, _, replica = self.get(self.client, reverse('posts:index'))
+        self.assertEqual(response.wsgi_request.db_replica, REPLICA)
+        self.assertTrue(replica)
+        self.assertContains(response, 'Пост')
+        card_keys = [
+            card_key(self.post, variant) for variant in VARIANTS
+        ]
+        self.assertFalse(cache.get_many(card_keys))
+        self.client.cookies[STICKY_COOKIE] = '1'
+        response, _, replica = self.get(self.client, reverse('posts:index'))
+        self.assertIsNone(response.wsgi_request.db_replica)
+        self.assertFalse(replica)
+        self.assertTrue(cache.get_many(card_keys))
+
+    def test_page_cache_miss_is_computed_on_primary(self):
+        """Проверяем, что страницу для кеша считает основная база."""
+        response, default, replica = self.get(
+            Client(), reverse('posts:index')
+        )
+        self.assertEqual(response.wsgi_request.db_replica, REPLICA)
+        self.assertFalse(response.wsgi_request.page_cache_hit)
+        self.assertTrue(default)
+        self.assertFalse(replica)
+
+    def test_write_makes_reads_sticky(self):
+        """Проверяем, что после комментария чтения идут в основную базу."""
+        response = self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Комментарий'}
+        )
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        response = self.client.get(reverse('posts:index'))
+        self.assertIsNone(response.wsgi_request.db_replica)
+        self.assertContains(response, 'Пост')
+
+
+class SqlitePragmaTests(TestCase):
+    def test_new_connection_gets_pragmas(self):
+        """Проверяем, что PRAGMA из настроек применены к соединению."""
+        with connection.cursor() as cursor:
+            for name in ('busy_timeout', 'cache_size'):
+                cursor.execute(f'PRAGMA {name}')
+                self.assertEqual(
+                    cursor.fetchone()[0], settings.SQLITE_PRAGMAS[name]
+                )
+
+
+class StampedeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+
+    def compute(self, value='fresh'):
+        def compute():
+            self.calls.append(value)
+            return value
+        return compute
+
+    def test_value_is_computed_once(self):
+        """Проверяем, что значение считается один раз."""
+        self.assertEqual(remember('key', self.compute(), 60), 'fresh')
+        self.assertEqual(remember('key', self.compute(), 60), 'fresh')
+        self.assertEqual(self.calls, ['fresh'])
+
+    def test_stale_value_is_served_while_locked(self):
+        """Проверяем, что пока пересчитывает другой, отдаётся старое."""
+        cache.set('stale:key', 'old')
+        cache.add('lock:key', 1)
+        self.assertEqual(
+            remember('key', self.compute(), 60, stale_key='stale:key'), 'old'
+        )
+        self.assertEqual(self.calls, [])
+
+    def test_waits_for_concurrent_computation(self):
+        """Проверяем, что без старого значения ждём чужой пересчёт."""
+        cache.add('lock:key', 1)
+
+        def finish():
+            time.sleep(0.1)
+            cache.set('key', ('theirs', 0.1, time.time() + 60))
+            cache.delete('lock:key')
+
+        thread = threading.Thread(target=finish)
+        thread.start()
+        self.assertEqual(remember('key', self.compute(), 60), 'theirs')
+        thread.join()
+        self.assertEqual(self.calls, [])
+
+    def test_stale_value_is_not_served_when_forbidden(self):
+        """Проверяем, что без stale_ok ждём пересчёт, а не старое."""
+        cache.set('stale:key', 'old')
+        cache.add('lock:key', 1)
+
+        def finish():
+            time.sleep(0.1)
+            cache.set('key', ('theirs', 0.1, time.time() + 60))
+            cache.delete('lock:key')
+
+        thread = threading.Thread(target=finish)
+        thread.start()
+        self.assertEqual(
+            remember(
+                'key', self.compute(), 60,
+                stale_key='stale:key', stale_ok=False
+            ),
+            'theirs'
+        )
+        thread.join()
+        self.assertEqual(self.calls, [])
+
+    def test_probabilistic_early_expiry(self):
+        """Проверяем досрочный пересчёт незадолго до истечения срока."""
+        cache.set('key', ('old', 1.0, time.time() + 1), 60)
+        self.assertEqual(remember('key', self.compute(), 60, beta=0), 'old')
+        self.assertEqual(
+            remember('key', self.compute(), 60, beta=1000), 'fresh'
+        )
+
+
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_every_response_has_total_and_db_timing(self):
+        """Проверяем общее время и время SQL у ответа вне выборки."""
+        header = self.client.get(reverse('posts:index'))['Server-Timing']
+        metrics = [part.split(';')[0] for part in header.split(', ')]
+        self.assertEqual(metrics, ['total', 'db'])
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+    def test_sampled_request_is_logged_and_aggregated(self):
+        """Проверяем подробный замер, строку лога и гистограмму."""
+        with self.assertLogs('core.timing', 'INFO') as logs:
+            response = self.client.get(reverse('posts:index'))
+        header = response['Server-Timing']
+        for metric in ('total', 'db', 'tpl', 'cache', 'thumb'):
+            self.assertIn(f'{metric};dur=', header)
+        self.assertRegex(
+            header, r'cache;dur=[\d.]+;desc="\d+ hits, \d+ misses"'
+        )
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['tpl_ms'], 0)
+        self.assertEqual(timing.histograms()['posts:index']['count'], 1)
+
+    def test_timed_template_keeps_backend_api(self):
+        """Проверяем, что обёртка шаблона отдаёт template и origin."""
+        template = get_template('posts/index.html')
+        self.assertIsInstance(template, timing.TimedTemplate)
+        self.assertIn('{% extends', template.template.source)
+        self.assertTrue(template.origin.name.endswith('index.html'))
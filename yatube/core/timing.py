@@ -0,0 +1,225 @@
+import json
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.backends.django import DjangoTemplates
+from django.urls import URLPattern, URLResolver, get_resolver
+
+logger = logging.getLogger(__name__)
+_current = threading.local()
+
+# Метрики подробного замера; они пересекаются: tpl включает запросы
+# к базе, кешу и миниатюрам, которые выполняются внутри шаблона.
+METRICS = ('tpl', 'cache', 'thumb')
+# Верхние границы корзин гистограмм времени ответа, мс.
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+HISTOGRAM_PREFIX = 'timing:'
+
+
+class Timings:
+    """Время по метрикам и обращения к кешу за один запрос."""
+
+    def __init__(self):
+        self.durations = dict.fromkeys(METRICS, 0.0)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.open = set()
+
+
+def active():
+    """Замер текущего запроса или None, если запрос не попал в выборку."""
+    return getattr(_current, 'timings', None)
+
+
+@contextmanager
+def measure(metric):
+    """Добавить время блока к метрике; вложенные блоки не считаются."""
+    timings = active()
+    if timings is None or metric in timings.open:
+        yield
+        return
+    timings.open.add(metric)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.durations[metric] += time.perf_counter() - start
+        timings.open.discard(metric)
+
+
+def count_cache(hits, misses):
+    timings = active()
+    if timings is not None:
+        timings.cache_hits += hits
+        timings.cache_misses += misses
+
+
+class TimedTemplate:
+    # Остальные атрибуты (template, origin) -- как у шаблона бэкенда.
+    def __init__(self, template):
+        self._backend = template
+
+    def __getattr__(self, name):
+        return getattr(self._backend, name)
+
+    def render(self, context=None, request=None):
+        with measure('tpl'):
+            return self._backend.render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Шаблоны Django с замером времени отрисовки (метрика tpl)."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def _bucket(milliseconds):
+    index = bisect_left(BUCKETS, milliseconds)
+    return str(BUCKETS[index]) if index < len(BUCKETS) else 'inf'
+
+
+def _incr(key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+
+
+def record(view_name, milliseconds):
+    """Добавить время ответа в гистограмму view (общую через кеш)."""
+    prefix = f'{HISTOGRAM_PREFIX}{view_name}:'
+    _incr(prefix + 'count', 1)
+    _incr(prefix + 'sum', round(milliseconds))
+    _incr(prefix + _bucket(milliseconds), 1)
+
+
+def view_names(patterns=None, namespace=''):
+    """Имена всех адресов проекта вида posts:index."""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    names = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names.extend(view_names(
+                pattern.url_patterns,
+                f'{namespace}{pattern.namespace}:' if pattern.namespace
+                else namespace
+            ))
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.append(namespace + pattern.name)
+    return names
+
+
+def histograms():
+    """
+    {имя view: {'count', 'avg', 'p50', 'p95', 'buckets'}} по сохранённым
+    замерам; перцентили -- верхние границы корзин.
+    """
+    bounds = [str(bound) for bound in BUCKETS] + ['inf']
+    result = {}
+    for name in view_names():
+        prefix = f'{HISTOGRAM_PREFIX}{name}:'
+        values = cache.get_many(
+            [prefix + key for key in ('count', 'sum', *bounds)]
+        )
+        count = values.get(prefix + 'count')
+        if not count:
+            continue
+        buckets = {bound: values.get(prefix + bound, 0) for bound in bounds}
+        result[name] = {
+            'count': count,
+            'avg': round(values.get(prefix + 'sum', 0) / count, 1),
+            'p50': _percentile(buckets, count, 0.5),
+            'p95': _percentile(buckets, count, 0.95),
+            'buckets': buckets,
+        }
+    return result
+
+
+def _percentile(buckets, count, share):
+    seen = 0
+    for bound, hits in buckets.items():
+        seen += hits
+        if seen >= share * count:
+            return bound
+    return 'inf'
+
+
+def _header(name, seconds, description=None):
+    value = f'{name};dur={seconds * 1000:.1f}'
+    if description:
+        value += f';desc="{description}"'
+    return value
+
+
+class ServerTimingMiddleware:
+    """
+    Заголовок Server-Timing с общим временем ответа и временем SQL
+    (request.query_stats) у каждого ответа. Доля
+    SERVER_TIMING_SAMPLE_RATE запросов замеряется подробно: шаблоны,
+    кеш (попадания и промахи), миниатюры; такой замер пишется в лог
+    core.timing строкой JSON и в гистограмму по имени view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampled = random.random() < settings.SERVER_TIMING_SAMPLE_RATE
+        _current.timings = timings = Timings() if sampled else None
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.timings = None
+        total = time.perf_counter() - start
+        headers = [_header('total', total)]
+        stats = getattr(request, 'query_stats', None)
+        if stats is not None:
+            headers.append(_header('db', stats.duration, f'{stats.count} SQL'))
+        if timings is not None:
+            for metric in METRICS:
+                description = None
+                if metric == 'cache':
+                    description = (
+                        f'{timings.cache_hits} hits, '
+                        f'{timings.cache_misses} misses'
+                    )
+                headers.append(_header(
+                    metric, timings.durations[metric], description
+                ))
+            self.report(request, response, total, stats, timings)
+        response['Server-Timing'] = ', '.join(headers)
+        return response
+
+    def report(self, request, response, total, stats, timings):
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match is not None else None
+        milliseconds = total * 1000
+        if view_name:
+            record(view_name, milliseconds)
+        logger.info(json.dumps({
+            'view': view_name,
+            'method': request.method,
+            'status': response.status_code,
+            'total_ms': round(milliseconds, 2),
+            'db_ms': round(stats.duration * 1000, 2) if stats else None,
+            'queries': stats.count if stats else None,
+            **{
+                f'{metric}_ms': round(timings.durations[metric] * 1000, 2)
+                for metric in METRICS
+            },
+            'cache_hits': timings.cache_hits,
+            'cache_misses': timings.cache_misses,
+        }))
@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
+from PIL import Image
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        # Защита от «бомб»: Pillow откажется декодировать картинку
+        # больше двух таких лимитов и в миниатюрах, и в вариантах.
+        Image.MAX_IMAGE_PIXELS = settings.IMAGE_UPLOAD_MAX_PIXELS
@@ -0,0 +1,521 @@
+import copy
+import json
+import math
+import random
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import blobs, counters, search, timeline
+from .importer import chunked, insert_rows
+from .models import Comment, Follow, Group, Post, TimelineEntry, UserCounters
+
+BENCH_PREFIX = 'bench_'
+# Показатели степенного закона: популярность авторов и постов
+# (Ципф) и число подписок пользователя (Парето).
+ZIPF_EXPONENT = 1.1
+PARETO_ALPHA = 2.0
+MAX_FOLLOWS = 1000
+NUM_OF_IMAGES = 20
+# Сколько читателей входят на сайт в сценариях с авторизацией.
+LOGGED_IN_READERS = 20
+DATASET_PERIOD = timedelta(days=365)
+WORDS = (
+    'кот', 'собака', 'город', 'море', 'утро', 'вечер', 'книга', 'дорога',
+    'работа', 'друг', 'лето', 'зима', 'песня', 'фильм', 'поезд', 'окно',
+    'дождь', 'солнце', 'чай', 'кофе', 'сад', 'река', 'гора', 'письмо',
+    'читать', 'писать', 'гулять', 'думать', 'смотреть', 'слушать',
+    'новый', 'старый', 'тихий', 'яркий', 'долгий', 'последний',
+)
+SCENARIOS = (
+    'index', 'group_posts', 'profile', 'post_detail', 'follow_index',
+    'add_comment',
+)
+# Изменение метрики больше чем на столько считается регрессией.
+REGRESSION_THRESHOLD = 0.1
+# Режим SQLite по умолчанию: журнал отката, для сравнения с SQLITE_PRAGMAS.
+ROLLBACK_PRAGMAS = {'journal_mode': 'delete', 'synchronous': 'full'}
+# Доля новых постов среди записей в contention(), остальное -- комментарии.
+POST_SHARE = 0.1
+
+User = get_user_model()
+
+
+def zipf_weights(size):
+    """Накопленные веса для random.choices: первые элементы популярнее."""
+    return list(accumulate(
+        1 / (rank ** ZIPF_EXPONENT) for rank in range(1, size + 1)
+    ))
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _images(rng):
+    storage = Post._meta.get_field('image').storage
+    names = []
+    for _ in range(NUM_OF_IMAGES):
+        buffer = BytesIO()
+        color = tuple(rng.randrange(256) for _ in range(3))
+        Image.new('RGB', (1200, 800), color).save(buffer, 'JPEG')
+        names.append(storage.save('posts/bench.jpg', ContentFile(
+            buffer.getvalue(), 'bench.jpg'
+        )))
+    return names
+
+
+def seed(users, posts, follows, comments, groups=20, image_share=0.1,
+         random_seed=42, log=print):
+    """
+    Заполнить базу синтетическими данными: пользователи bench_*, посты
+    и комментарии со степенным распределением по авторам и постам,
+    граф подписок со степенным распределением подписчиков. Сигналы
+    не вызываются: счётчики и ленты подписок строятся в конце целиком.
+    Поисковый индекс не строится (rebuild_search_index).
+    """
+    if (User.objects.filter(username__startswith=BENCH_PREFIX).exists()
+            or Group.objects.filter(slug__startswith='bench-').exists()):
+        raise ValueError(
+            'Данные для нагрузки уже есть: удалите их (seed_benchmark '
+            '--flush).'
+        )
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    for batch in chunked(
+        User(username=f'{BENCH_PREFIX}{i}', password='!',
+             first_name=f'Имя{i}', last_name=f'Фамилия{i}')
+        for i in range(users)
+    ):
+        User.objects.bulk_create(batch)
+    user_ids = list(
+        User.objects.filter(username__startswith=BENCH_PREFIX)
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    Group.objects.bulk_create(
+        Group(title=f'Группа {i}', slug=f'bench-{i}',
+              description=_text(rng, 10))
+        for i in range(groups)
+    )
+    group_ids = list(
+        Group.objects.filter(slug__startswith='bench-')
+        .values_list('pk', flat=True)
+    )
+    log(f'Пользователей: {len(user_ids)}, групп: {len(group_ids)}')
+
+    images = _images(rng) if image_share else []
+    author_weights = zipf_weights(len(user_ids))
+    # insert_rows сохраняет даты из объектов, bulk_create подставил бы
+    # текущее время.
+    for batch in chunked(
+        Post(
+            text=_text(rng, rng.randint(5, 60)),
+            author_id=rng.choices(user_ids, author_weights)[0],
+            group_id=(
+                rng.choice(group_ids) if rng.random() < 0.5 else None
+            ),
+            image=(
+                rng.choice(images) if rng.random() < image_share else ''
+            ),
+            pub_date=now - DATASET_PERIOD * rng.random(),
+            updated=now,
+        )
+        for _ in range(posts)
+    ):
+        insert_rows(Post, batch)
+    log(f'Постов: {posts}')
+
+    def follow_rows():
+        scale = follows * (PARETO_ALPHA - 1) / PARETO_ALPHA
+        for user_id in user_ids:
+            count = min(
+                MAX_FOLLOWS,
+                round(scale * rng.paretovariate(PARETO_ALPHA))
+            )
+            authors = set(rng.choices(user_ids, author_weights, k=count))
+            authors.discard(user_id)
+            for author_id in authors:
+                yield Follow(user_id=user_id, author_id=author_id)
+
+    total_follows = 0
+    for batch in chunked(follow_rows()):
+        Follow.objects.bulk_create(batch)
+        total_follows += len(batch)
+    log(f'Подписок: {total_follows}')
+
+    post_ids = list(
+        Post.objects.filter(author__username__startswith=BENCH_PREFIX)
+        .order_by('-pub_date').values_list('pk', flat=True)
+    )
+    post_weights = zipf_weights(len(post_ids))
+    for batch in chunked(
+        Comment(
+            post_id=rng.choices(post_ids, post_weights)[0],
+            author_id=rng.choice(user_ids),
+            text=_text(rng, rng.randint(3, 30)),
+            created=now - DATASET_PERIOD * rng.random() / 12,
+        )
+        for _ in range(comments)
+    ):
+        insert_rows(Comment, batch)
+    log(f'Комментариев: {comments}')
+
+    counters.recount_all()
+    blobs.recount()
+    log(f'Записей лент подписок: {timeline.rebuild()}')
+    cache.clear()
+    return user_ids
+
+
+def _delete(queryset):
+    # DELETE ... WHERE id IN (SELECT ...): без сигналов и каскада.
+    opts = queryset.model._meta
+    quote = connection.ops.quote_name
+    subquery, params = queryset.values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(opts.db_table)} '
+            f'WHERE {quote(opts.pk.column)} IN ({subquery})',
+            params
+        )
+        return cursor.rowcount
+
+
+def flush():
+    """
+    Удалить данные seed() набором DELETE по таблицам. Каскад Django
+    отправлял бы сигналы на каждую строку, и каждый пересчитывал бы
+    счётчики и сбрасывал кеш; здесь счётчики и ссылки на картинки
+    пересчитываются, а кеш очищается один раз в конце.
+    """
+    users = User.objects.filter(username__startswith=BENCH_PREFIX)
+    posts = Post.objects.filter(author__in=users)
+    groups = Group.objects.filter(slug__startswith='bench-')
+    deleted = 0
+    with transaction.atomic():
+        # Чужие посты в группах заполнения остаются без группы,
+        # как при on_delete=SET_NULL.
+        Post.objects.filter(group__in=groups).exclude(
+            author__in=users
+        ).update(group=None)
+        search.unindex_queryset(posts)
+        for queryset in (
+            TimelineEntry.objects.filter(
+                Q(user__in=users) | Q(post__in=posts)
+            ),
+            Comment.objects.filter(Q(author__in=users) | Q(post__in=posts)),
+            Follow.objects.filter(Q(user__in=users) | Q(author__in=users)),
+            UserCounters.objects.filter(user__in=users),
+            LogEntry.objects.filter(user__in=users),
+            User.groups.through.objects.filter(user__in=users),
+            User.user_permissions.through.objects.filter(user__in=users),
+            posts,
+            groups,
+            users,
+        ):
+            deleted += _delete(queryset)
+    counters.recount_all()
+    blobs.recount()
+    cache.clear()
+    return deleted
+
+
+class Targets:
+    """Случайные адреса для сценариев: популярное запрашивают чаще."""
+
+    def __init__(self, rng, sample=1000):
+        self.rng = rng
+        users = User.objects.filter(username__startswith=BENCH_PREFIX)
+        self.authors = list(
+            users.order_by('-counters__followers_count')
+            .values_list('username', flat=True)[:sample]
+        )
+        self.readers = list(
+            users.order_by('-counters__following_count')[:sample]
+        )
+        self.posts = list(
+            Post.objects.filter(author__in=users)
+            .order_by('-comments_count').values_list('pk', flat=True)[:sample]
+        )
+        self.groups = list(
+            Group.objects.filter(slug__startswith='bench-')
+            .values_list('slug', flat=True)
+        )
+        if not (self.authors and self.posts and self.groups):
+            raise ValueError(
+                'Нет данных для нагрузки: сначала seed_benchmark.'
+            )
+        self.author_weights = zipf_weights(len(self.authors))
+        self.post_weights = zipf_weights(len(self.posts))
+
+    def fork(self, rng):
+        targets = copy.copy(self)
+        targets.rng = rng
+        return targets
+
+    def author(self):
+        return self.rng.choices(self.authors, self.author_weights)[0]
+
+    def post(self):
+        return self.rng.choices(self.posts, self.post_weights)[0]
+
+    def request(self, scenario):
+        """(метод, адрес, данные, нужен ли вход) для сценария."""
+        page = {'page': self.rng.randint(1, 5)}
+        if scenario == 'index':
+            return 'get', reverse('posts:index'), page, False
+        if scenario == 'group_posts':
+            return 'get', reverse('posts:group_list', kwargs={
+                'slug': self.rng.choice(self.groups)
+            }), page, False
+        if scenario == 'profile':
+            return 'get', reverse('posts:profile', kwargs={
+                'username': self.author()
+            }), page, False
+        if scenario == 'post_detail':
+            return 'get', reverse('posts:post_detail', kwargs={
+                'post_id': self.post()
+            }), None, False
+        if scenario == 'follow_index':
+            return 'get', reverse('posts:follow_index'), page, True
+        if scenario == 'add_comment':
+            return 'post', reverse('posts:add_comment', kwargs={
+                'post_id': self.post()
+            }), {'text': _text(self.rng, 10)}, True
+        raise ValueError(f'Неизвестный сценарий: {scenario}')
+
+
+def percentile(values, share):
+    """Перцентиль методом ближайшего ранга."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+
+def _logged_in(readers):
+    clients = []
+    for reader in readers:
+        client = Client()
+        client.force_login(reader)
+        clients.append(client)
+    return clients
+
+
+def _drive(scenario, requests, targets, clients, samples, errors):
+    anonymous = Client()
+    for _ in range(requests):
+        method, url, data, login = targets.request(scenario)
+        client = targets.rng.choice(clients) if login else anonymous
+        start = time.perf_counter()
+        try:
+            response = getattr(client, method)(url, data)
+        except Exception as error:
+            # Под нагрузкой SQLite отвечает «database is locked»:
+            # это ошибка прогона, а не повод его прерывать.
+            errors.append(type(error).__name__)
+            continue
+        elapsed = time.perf_counter() - start
+        samples.append((elapsed, response.wsgi_request.query_stats.count))
+        if response.status_code >= 400:
+            errors.append(response.status_code)
+
+
+def _drive_in_thread(*args):
+    try:
+        _drive(*args)
+    finally:
+        connection.close()
+
+
+def run(scenarios=SCENARIOS, requests=200, warmup=20, threads=1,
+        random_seed=42):
+    """
+    Прогнать сценарии через тестовый клиент в threads потоков.
+    Возвращает {сценарий: метрики}: задержки в миллисекундах,
+    запросов в секунду и число SQL-запросов на запрос.
+    """
+    rng = random.Random(random_seed)
+    targets = Targets(rng)
+    readers = rng.sample(
+        targets.readers, min(LOGGED_IN_READERS, len(targets.readers))
+    )
+    results = {}
+    # Без панели отладки и журнала SQL-запросов, как в бою.
+    with override_settings(DEBUG=False):
+        for scenario in scenarios:
+            _drive(
+                scenario, warmup, targets, _logged_in(readers), [], []
+            )
+            samples, errors = [], []
+            workers = [
+                threading.Thread(target=_drive_in_thread, args=(
+                    scenario,
+                    requests // threads,
+                    targets.fork(random.Random(rng.random())),
+                    _logged_in(readers),
+                    samples,
+                    errors
+                ))
+                for _ in range(threads)
+            ] if threads > 1 else []
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            if not workers:
+                _drive(
+                    scenario, requests, targets, _logged_in(readers),
+                    samples, errors
+                )
+            for worker in workers:
+                worker.join()
+            wall = time.perf_counter() - start
+            latencies = [elapsed * 1000 for elapsed, _ in samples]
+            queries = [count for _, count in samples]
+            results[scenario] = {
+                'requests': len(samples),
+                'errors': len(errors),
+                'rps': round(len(samples) / wall, 1),
+                'p50': round(percentile(latencies, 0.5), 2),
+                'p95': round(percentile(latencies, 0.95), 2),
+                'p99': round(percentile(latencies, 0.99), 2),
+                'queries': round(sum(queries) / max(len(queries), 1), 2),
+                'max_queries': max(queries, default=0),
+            }
+    return results
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Сравнить с сохранённым прогоном. Возвращает строки
+    (сценарий, метрика, было, стало, изменение, регрессия ли).
+    """
+    rows = []
+    for scenario, metrics in results.items():
+        previous = baseline.get(scenario)
+        if previous is None:
+            continue
+        for metric in ('p50', 'p95', 'p99', 'rps', 'queries'):
+            before, after = previous.get(metric), metrics[metric]
+            if not before:
+                continue
+            change = (after - before) / before
+            # Для пропускной способности хуже -- когда меньше.
+            worse = -change if metric == 'rps' else change
+            rows.append((
+                scenario, metric, before, after, change,
+                worse > threshold
+            ))
+    return rows
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as file_:
+        return json.load(file_)
+
+
+def save_baseline(path, results):
+    with open(path, 'w', encoding='utf-8') as file_:
+        json.dump(results, file_, ensure_ascii=False, indent=2)
+
+
+def _contend(write, targets, start, duration, connect_lock, stats):
+    # Соединения открываются по одному: первое переключает режим журнала,
+    # а SQLite не меняет его, пока открыты другие соединения.
+    with connect_lock:
+        connection.ensure_connection()
+    authors = [reader.pk for reader in targets.readers]
+    start.wait()
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        begin = time.perf_counter()
+        try:
+            if not write:
+                list(Post.objects.select_related('author', 'group')[:11])
+                list(Post.objects.filter(
+                    author__username=targets.author()
+                ).select_related('group')[:11])
+            elif targets.rng.random() < POST_SHARE:
+                Post.objects.create(
+                    author_id=targets.rng.choice(authors),
+                    text=_text(targets.rng, 20)
+                )
+            else:
+                Comment.objects.create(
+                    post_id=targets.post(),
+                    author_id=targets.rng.choice(authors),
+                    text=_text(targets.rng, 10)
+                )
+        except DatabaseError as error:
+            stats['errors'].append(type(error).__name__)
+            continue
+        stats['writes' if write else 'reads'].append(
+            time.perf_counter() - begin
+        )
+
+
+def _contend_in_thread(*args):
+    try:
+        _contend(*args)
+    finally:
+        connection.close()
+
+
+def contention(pragmas, readers=4, writers=2, duration=5.0, random_seed=42):
+    """
+    Одновременно читать ленты в readers потоков и писать комментарии
+    и посты в writers потоков duration секунд с настройками SQLite
+    pragmas. Возвращает чтений и записей в секунду, p95 задержки
+    в миллисекундах и число ошибок («database is locked»).
+    """
+    rng = random.Random(random_seed)
+    targets = Targets(rng)
+    stats = {'reads': [], 'writes': [], 'errors': []}
+    with override_settings(SQLITE_PRAGMAS={
+        **settings.SQLITE_PRAGMAS, **pragmas
+    }):
+        # Соединение основного потока держит режим журнала; в тестах
+        # оно внутри транзакции, и закрывать его нельзя.
+        if not connection.in_atomic_block:
+            connection.close()
+        start = threading.Barrier(readers + writers + 1)
+        connect_lock = threading.Lock()
+        workers = [
+            threading.Thread(target=_contend_in_thread, args=(
+                number < writers,
+                targets.fork(random.Random(rng.random())),
+                start,
+                duration,
+                connect_lock,
+                stats
+            ))
+            for number in range(readers + writers)
+        ]
+        for worker in workers:
+            worker.start()
+        start.wait()
+        begin = time.perf_counter()
+        for worker in workers:
+            worker.join()
+        wall = time.perf_counter() - begin
+    return {
+        'reads': round(len(stats['reads']) / wall, 1),
+        'writes': round(len(stats['writes']) / wall, 1),
+        'read_p95': round(percentile(stats['reads'], 0.95) * 1000, 2),
+        'write_p95': round(percentile(stats['writes'], 0.95) * 1000, 2),
+        'errors': len(stats['errors']),
+    }
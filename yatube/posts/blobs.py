@@ -0,0 +1,152 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from sorl.thumbnail import delete as delete_with_thumbnails
+
+from .models import ImageBlob, ImageVariant, Post
+
+# Файл без ссылок удаляется не сразу: пост с ним может сохраняться
+# прямо сейчас, а правку с заменой картинки могут откатить.
+GC_GRACE_PERIOD = timedelta(hours=1)
+BLOBS_DIR = 'posts'
+# Столько строк вставляется и столько имён уходит в IN (...) за раз.
+BATCH_SIZE = 500
+
+
+def image_storage():
+    return Post._meta.get_field('image').storage
+
+
+def acquire(name):
+    if not name:
+        return
+    blobs = ImageBlob.objects.filter(name=name)
+    if blobs.update(references=F('references') + 1, updated=timezone.now()):
+        return
+    try:
+        with transaction.atomic():
+            ImageBlob.objects.create(name=name, references=1)
+    except IntegrityError:
+        # Строку только что создал параллельный запрос.
+        blobs.update(references=F('references') + 1, updated=timezone.now())
+
+
+def release(name):
+    if not name:
+        return
+    ImageBlob.objects.filter(name=name, references__gt=0).update(
+        references=F('references') - 1,
+        updated=timezone.now()
+    )
+
+
+def recount(names=None):
+    """
+    Пересчитать ссылки на файлы по постам; возвращает число файлов.
+    names -- пересчитать только эти файлы (например, из загрузки).
+    """
+    if names is None:
+        return _recount(Post.objects.all(), ImageBlob.objects.all())
+    names = sorted(set(filter(None, names)))
+    counted = 0
+    for start in range(0, len(names), BATCH_SIZE):
+        chunk = names[start:start + BATCH_SIZE]
+        counted += _recount(
+            Post.objects.filter(image__in=chunk),
+            ImageBlob.objects.filter(name__in=chunk)
+        )
+    return counted
+
+
+def _recount(posts, blobs):
+    names = posts.exclude(image='').values_list('image', flat=True).distinct()
+    ImageBlob.objects.bulk_create(
+        [ImageBlob(name=name) for name in names.iterator()],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    return blobs.update(references=Coalesce(
+        Subquery(
+            Post.objects.filter(image=OuterRef('name'))
+            .order_by()
+            .values('image')
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    ))
+
+
+def delete_file(name):
+    """Удалить файл картинки, его миниатюры и варианты."""
+    delete_with_thumbnails(name)
+    variants = ImageVariant.objects.filter(source=name)
+    files = set(variants.values_list('file', flat=True))
+    variants.delete()
+    # Одинаковые варианты разных картинок хранятся одним файлом.
+    shared = ImageVariant.objects.filter(file__in=files).values_list(
+        'file', flat=True
+    )
+    for file_name in files - set(shared):
+        default_storage.delete(file_name)
+
+
+def _stale(name, cutoff):
+    # Время изменения файла обновляется и при повторной загрузке той же
+    # картинки: такой файл вот-вот получит ссылку.
+    storage = image_storage()
+    return not Post.objects.filter(image=name).exists() and not (
+        storage.exists(name) and storage.get_modified_time(name) >= cutoff
+    )
+
+
+def untracked_files():
+    """Файлы хранилища по хешу содержимого, которых нет в ImageBlob."""
+    storage = image_storage()
+    if not storage.exists(BLOBS_DIR):
+        return []
+    names = []
+    for directory in storage.listdir(BLOBS_DIR)[0]:
+        path = f'{BLOBS_DIR}/{directory}'
+        names.extend(
+            f'{path}/{file_name}' for file_name in storage.listdir(path)[1]
+        )
+    names = [name for name in names if storage.is_blob(name)]
+    tracked = set(
+        ImageBlob.objects.filter(name__in=names).values_list(
+            'name', flat=True
+        )
+    )
+    return [name for name in names if name not in tracked]
+
+
+def collect(grace=GC_GRACE_PERIOD):
+    """
+    Удалить файлы, на которые дольше grace не ссылается ни один пост:
+    и учтённые в ImageBlob, и оставшиеся от несохранённых постов.
+    Возвращает имена удалённых файлов.
+    """
+    cutoff = timezone.now() - grace
+    removed = []
+    unreferenced = ImageBlob.objects.filter(
+        references=0,
+        updated__lt=cutoff
+    ).values_list('pk', 'name')
+    for pk, name in list(unreferenced):
+        if not _stale(name, cutoff):
+            continue
+        # Строка удаляется, только если на файл так и не сослались.
+        deleted, _ = ImageBlob.objects.filter(pk=pk, references=0).delete()
+        if deleted:
+            delete_file(name)
+            removed.append(name)
+    for name in untracked_files():
+        if _stale(name, cutoff):
+            delete_file(name)
+            removed.append(name)
+    return removed
@@ -0,0 +1,62 @@
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from core.replicas import replica_reads
+
+from . import thumbnails
+
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+CARD_TEMPLATE = 'includes/post.html'
+VARIANTS = ('00', '01', '10', '11')
+
+
+def _variant(all_author_posts_link, all_group_posts_link):
+    return f'{int(all_author_posts_link)}{int(all_group_posts_link)}'
+
+
+def card_key(post, variant):
+    # Штамп updated меняется при каждом сохранении поста, поэтому
+    # устаревшие карточки не читаются и просто вытесняются по TTL.
+    stamp = int(post.updated.timestamp() * 1000000)
+    return f'post_card:{post.pk}:{stamp}:{variant}'
+
+
+def render_card(post, variant):
+    return render_to_string(CARD_TEMPLATE, {
+        'post': post,
+        'all_author_posts_link': variant[0] == '1',
+        'all_group_posts_link': variant[1] == '1',
+    })
+
+
+def load_cards(posts, variant):
+    """Карточки постов страницы: один get_many и один set_many."""
+    keys = {card_key(post, variant): post for post in posts}
+    cards = cache.get_many(keys)
+    thumbnails.prefetch(
+        post for key, post in keys.items() if key not in cards
+    )
+    missing = {
+        key: render_card(post, variant)
+        for key, post in keys.items()
+        if key not in cards
+    }
+    # Посты, прочитанные из реплики, могут отставать: такие карточки
+    # выводятся, но в кеш не кладутся.
+    if missing and not replica_reads():
+        cache.set_many(missing, CARD_CACHE_TIMEOUT)
+    cards.update(missing)
+    return {post.pk: cards[key] for key, post in keys.items()}
+
+
+def get_card(post, page, all_author_posts_link, all_group_posts_link):
+    variant = _variant(all_author_posts_link, all_group_posts_link)
+    if not hasattr(page, 'cards'):
+        page.cards = {}
+    if variant not in page.cards:
+        page.cards[variant] = load_cards(page, variant)
+    return page.cards[variant][post.pk]
+
+
+def delete_cards(post):
+    cache.delete_many([card_key(post, variant) for variant in VARIANTS])
@@ -0,0 +1,118 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, UserCounters
+
+# Столько id за раз уходит в IN (...): старые SQLite не принимают
+# больше 999 параметров в запросе.
+LOOKUP_SIZE = 500
+
+User = get_user_model()
+
+
+def _count(queryset, field, outer='pk'):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef(outer)})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def create_counters(user_id):
+    counters, _ = UserCounters.objects.get_or_create(
+        user_id=user_id,
+        defaults={
+            'posts_count': Post.objects.filter(author_id=user_id).count(),
+            'followers_count': Follow.objects.filter(
+                author_id=user_id
+            ).count(),
+            'following_count': Follow.objects.filter(
+                user_id=user_id
+            ).count(),
+        }
+    )
+    return counters
+
+
+def get_counters(user):
+    """
+    Счётчики пользователя. Без запроса, если они подтянуты через
+    select_related('counters'); при отсутствии строки она создаётся
+    по фактическим данным.
+    """
+    try:
+        return user.counters
+    except UserCounters.DoesNotExist:
+        return create_counters(user.pk)
+
+
+def adjust_user(user_id, field, delta):
+    counters = UserCounters.objects.filter(user_id=user_id)
+    if delta < 0:
+        counters.filter(**{f'{field}__gte': -delta}).update(
+            **{field: F(field) + delta}
+        )
+    elif not counters.update(**{field: F(field) + delta}):
+        # Строки ещё нет: создаём её сразу с актуальными значениями.
+        create_counters(user_id)
+
+
+def adjust_comments(post_id, delta):
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    posts.update(comments_count=F('comments_count') + delta)
+
+
+def recount_all():
+    """Пересчитать все счётчики набором UPDATE-запросов."""
+    return _recount()
+
+
+def recount(user_ids=(), post_ids=()):
+    """
+    Пересчитать счётчики только пользователей user_ids и постов
+    post_ids (например, затронутых загрузкой) пачками по LOOKUP_SIZE.
+    """
+    user_ids, post_ids = sorted(set(user_ids)), sorted(set(post_ids))
+    users = posts = 0
+    for start in range(0, max(len(user_ids), len(post_ids)), LOOKUP_SIZE):
+        counted = _recount(
+            user_ids[start:start + LOOKUP_SIZE],
+            post_ids[start:start + LOOKUP_SIZE]
+        )
+        users += counted[0]
+        posts += counted[1]
+    return users, posts
+
+
+def _recount(user_ids=None, post_ids=None):
+    # Без списков id пересчитываются все пользователи и посты.
+    missing = User.objects.filter(counters__isnull=True)
+    user_counters = UserCounters.objects.all()
+    posts = Post.objects.all()
+    if user_ids is not None:
+        missing = missing.filter(pk__in=user_ids)
+        user_counters = user_counters.filter(user_id__in=user_ids)
+    if post_ids is not None:
+        posts = posts.filter(pk__in=post_ids)
+    UserCounters.objects.bulk_create([
+        UserCounters(user_id=user_id)
+        for user_id in missing.values_list('pk', flat=True).iterator()
+    ])
+    users = user_counters.update(
+        posts_count=_count(Post.objects, 'author', 'user_id'),
+        followers_count=_count(Follow.objects, 'author', 'user_id'),
+        following_count=_count(Follow.objects, 'user', 'user_id'),
+    )
+    posts = posts.update(
+        comments_count=_count(Comment.objects, 'post')
+    )
+    return users, posts
@@ -0,0 +1,91 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+
+from . import timeline, views
+from .models import Comment, Follow, Post
+from .paginator import FORWARD, CursorPaginator
+
+# Узлы плана, которые читают таблицу целиком или сортируют результат
+# во временной структуре.
+SQLITE_PROBLEMS = (
+    (
+        re.compile(r'\bSCAN (TABLE )?(?P<table>\w+)\b(?! USING)'),
+        'полный скан'
+    ),
+    (re.compile(r'USE TEMP B-TREE FOR (?P<table>.*)'), 'сортировка'),
+)
+POSTGRESQL_PROBLEMS = (
+    (re.compile(r'Seq Scan on (?P<table>\w+)'), 'полный скан'),
+    (re.compile(r'\bSort\b(?P<table>)'), 'сортировка'),
+)
+
+User = get_user_model()
+
+
+def _pages(name, queryset, per_page=views.NUM_OF_SHOWING_POSTS,
+           date_field='pub_date', allowed=()):
+    # Первая страница и страница по курсору, как их строит CursorPaginator.
+    paginator = CursorPaginator(queryset, per_page, date_field=date_field)
+    seek = paginator._seek(timezone.now(), 1, FORWARD)
+    return [
+        (name, paginator.object_list[:per_page + 1], allowed),
+        (f'{name} (курсор)',
+         paginator.object_list.filter(seek)[:per_page + 1], allowed),
+    ]
+
+
+def view_queries(user_id=1, author_id=2, group_id=1, post_id=1):
+    """
+    Запросы лент и страниц posts.views в том виде, в каком их
+    выполняют view: [(название, queryset, допустимые проблемы)].
+    Для EXPLAIN строки с такими id не нужны.
+    """
+    user = User(pk=user_id)
+    return [
+        *_pages('index', Post.objects.select_related('author', 'group')),
+        *_pages('group_posts', Post.objects.filter(
+            group_id=group_id
+        ).select_related('author')),
+        *_pages('profile', Post.objects.filter(
+            author_id=author_id
+        ).select_related('group')),
+        # Сортируется не больше TIMELINE_LENGTH постов ленты читателя.
+        *_pages(
+            'follow_index',
+            timeline.feed_for(user, pulled=[]).select_related(
+                'author', 'group'
+            ),
+            allowed={'сортировка'}
+        ),
+        *_pages(
+            'post_detail: комментарии',
+            Comment.objects.filter(post_id=post_id).select_related('author'),
+            per_page=views.NUM_OF_SHOWING_COMMENTS,
+            date_field='created'
+        ),
+        ('profile: подписан ли', Follow.objects.filter(
+            user_id=user_id, author_id=author_id
+        )[:1], ()),
+        ('подписчики автора', timeline.follower_ids(author_id), ()),
+        ('подписки читателя', Follow.objects.filter(
+            user_id=user_id
+        ).values_list('author_id', flat=True), ()),
+    ]
+
+
+def problems(plan, vendor=None):
+    """Полные сканы и сортировки в тексте плана: [(вид, таблица)]."""
+    vendor = vendor or connection.vendor
+    patterns = (
+        POSTGRESQL_PROBLEMS if vendor == 'postgresql' else SQLITE_PROBLEMS
+    )
+    found = []
+    for line in plan.splitlines():
+        for pattern, kind in patterns:
+            match = pattern.search(line)
+            if match:
+                found.append((kind, match.group('table').strip()))
+    return found
@@ -0,0 +1,81 @@
+import csv
+import json
+import zlib
+
+CHUNK_SIZE = 2000
+# Сжатые данные отдаются кусками не меньше этого размера.
+GZIP_BUFFER_SIZE = 64 * 1024
+FIELDS = (
+    'id', 'author', 'group', 'text', 'pub_date', 'image', 'image_url',
+    'comments_count',
+)
+FORMATS = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export_rows(posts, media_url):
+    """
+    Посты как словари в формате import_data, по одному: в памяти
+    держится не больше CHUNK_SIZE постов. media_url(имя) строит
+    ссылку на картинку.
+    """
+    posts = posts.select_related('author', 'group').order_by('pk')
+    for post in posts.iterator(chunk_size=CHUNK_SIZE):
+        yield {
+            'id': post.pk,
+            'author': post.author.username,
+            'group': post.group.slug if post.group else '',
+            'text': post.text,
+            'pub_date': post.pub_date.isoformat(),
+            'image': post.image.name,
+            'image_url': media_url(post.image.url) if post.image else '',
+            'comments_count': post.comments_count,
+        }
+
+
+class _Line:
+    # csv.writer пишет строку сюда и сразу получает её обратно.
+    def write(self, value):
+        return value
+
+
+def serialize(rows, format_):
+    """Строки JSONL или CSV в байтах."""
+    if format_ == 'csv':
+        writer = csv.DictWriter(_Line(), fieldnames=FIELDS)
+        yield writer.writeheader().encode()
+        for row in rows:
+            yield writer.writerow(row).encode()
+        return
+    for row in rows:
+        yield (json.dumps(row, ensure_ascii=False) + '\n').encode()
+
+
+def gzip_stream(chunks):
+    """Сжимать поток байтов в gzip на лету."""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    buffer = []
+    size = 0
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            buffer.append(compressed)
+            size += len(compressed)
+        if size >= GZIP_BUFFER_SIZE:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    buffer.append(compressor.flush())
+    yield b''.join(buffer)
+
+
+def export(posts, format_='jsonl', compress=False, media_url=str):
+    """Поток байтов выгрузки постов."""
+    stream = serialize(export_rows(posts, media_url), format_)
+    return gzip_stream(stream) if compress else stream
+
+
+def filename(name, format_, compress=False):
+    return f'{name}.{format_}' + ('.gz' if compress else '')
@@ -0,0 +1,142 @@
+import math
+import time
+from uuid import uuid4
+
+from django.core.cache import cache
+
+from core.replicas import primary
+
+FEED_COUNT_TIMEOUT = 60 * 15
+# Закешированные страницы лент живут долго: устаревают они не по времени,
+# а при смене поколения ленты.
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+
+ALL_POSTS = 'all'
+# Общее поколение для редких событий, меняющих карточки во всех лентах:
+# переименование группы или автора, удаление группы.
+SITE = 'site'
+
+
+def group_feed(group_id):
+    return f'group:{group_id}'
+
+
+def author_feed(author_id):
+    return f'author:{author_id}'
+
+
+def follow_feed(user_id):
+    return f'follow:{user_id}'
+
+
+def post_page(post_id):
+    # Страница поста: меняется с комментариями.
+    return f'post:{post_id}'
+
+
+def profile_page(user_id):
+    # Шапка профиля: меняется со счётчиками подписок.
+    return f'profile:{user_id}'
+
+
+def post_feeds(post):
+    """Ленты, в которые попадает пост (кроме лент подписчиков)."""
+    feeds = [ALL_POSTS, author_feed(post.author_id)]
+    if post.group_id:
+        feeds.append(group_feed(post.group_id))
+    return feeds
+
+
+def _count_key(feed):
+    return f'feed_count:{feed}'
+
+
+def get_total(feed, queryset):
+    """
+    Количество постов в ленте из кеша.
+
+    COUNT(*) выполняется только при промахе и в основной базе
+    (core.replicas.primary), дальше счётчик поддерживается сигналами
+    и живёт не дольше FEED_COUNT_TIMEOUT.
+    """
+    key = _count_key(feed)
+    total = cache.get(key)
+    if total is None:
+        with primary():
+            total = queryset.count()
+        cache.add(key, total, FEED_COUNT_TIMEOUT)
+    return total
+
+
+def adjust_totals(feeds, delta):
+    for feed in feeds:
+        try:
+            cache.incr(_count_key(feed), delta)
+        except ValueError:
+            # Счётчика нет в кеше: посчитаем при следующем запросе.
+            pass
+
+
+def reset_totals(feeds):
+    cache.delete_many([_count_key(feed) for feed in feeds])
+
+
+def _generation_key(feed):
+    return f'feed_gen:{feed}'
+
+
+def _new_generation():
+    # Время смены поколения нужно для Last-Modified (changed_at).
+    return f'{time.time():.6f}-{uuid4().hex}'
+
+
+def get_version(feeds):
+    """
+    Версия набора лент для ключей кеша: поколения всех лент одним
+    get_many. Потерянное поколение просто начинается заново.
+    """
+    feeds = [SITE, *feeds]
+    keys = {_generation_key(feed): feed for feed in feeds}
+    generations = cache.get_many(keys)
+    missing = {
+        key: _new_generation() for key in keys if key not in generations
+    }
+    if missing:
+        cache.set_many(missing, None)
+        generations.update(missing)
+    return '|'.join(
+        f'{feed}={generations[key]}' for key, feed in keys.items()
+    )
+
+
+def bump(feeds):
+    """Сменить поколения лент: их закешированные страницы устаревают."""
+    cache.set_many(
+        {_generation_key(feed): _new_generation() for feed in feeds},
+        None
+    )
+
+
+def changed_at(version):
+    """
+    Время последней смены поколений в версии get_version. Для
+    поколения без времени считается, что оно сменилось только что.
+    """
+    stamps = []
+    for part in version.split('|'):
+        try:
+            stamps.append(float(part.split('=', 1)[1].split('-', 1)[0]))
+        except (IndexError, ValueError):
+            stamps.append(time.time())
+    return max(stamps)
+
+
+def last_modified(version):
+    """
+    Last-Modified (секунды) для страницы версии version или None.
+    HTTP-даты с точностью до секунды, поэтому берётся следующая за
+    сменой поколения секунда и только когда она уже наступила: любая
+    следующая смена даст более позднюю дату.
+    """
+    stamp = math.floor(changed_at(version)) + 1
+    return stamp if time.time() >= stamp else None
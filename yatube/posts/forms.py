@@ -11,6 +11,16 @@ class PostForm(forms.ModelForm):
             'text': 'Напишите что-нибудь, но избегайте слова "ёж".',
         }
 
+    def __init__(self, *args, upload_errors=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Причины, по которым ImageUploadHandler не принял файлы.
+        self.upload_errors = upload_errors or {}
+
+    def clean_image(self):
+        if 'image' in self.upload_errors:
+            raise forms.ValidationError(self.upload_errors['image'])
+        return self.cleaned_data['image']
+
     def clean_text(self):
         data = self.cleaned_data['text']
         if 'ёж' in data.lower():
@@ -0,0 +1,443 @@
+import csv
+import gzip
+import json
+from contextlib import contextmanager, nullcontext
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.db.models.sql import InsertQuery
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import blobs, counters, feeds, search, timeline
+from .counters import LOOKUP_SIZE
+from .models import Comment, Follow, Group, Post
+
+BATCH_SIZE = 5000
+MAX_ERRORS = 100
+# Порядок загрузки: сначала то, на что ссылаются остальные.
+KINDS = ('users', 'groups', 'posts', 'comments', 'follows')
+
+User = get_user_model()
+
+
+class RowError(ValueError):
+    pass
+
+
+class ImportAborted(Exception):
+    pass
+
+
+def chunked(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert_rows(model, objects, ignore_conflicts=False):
+    """
+    Вставить объекты пачками, как bulk_create, но значения полей берутся
+    как есть (raw, как при загрузке фикстур): даты auto_now_add
+    и auto_now не заменяются текущим временем, а модель не меняется.
+    Возвращает число вставленных строк без пропущенных дубликатов.
+    """
+    opts = model._meta
+    inserted = 0
+    with connection.cursor() as cursor:
+        for with_pk in (True, False):
+            rows = [obj for obj in objects if (obj.pk is not None) == with_pk]
+            fields = [
+                field for field in opts.concrete_fields
+                if with_pk or field is not opts.auto_field
+            ]
+            size = max(connection.ops.bulk_batch_size(fields, rows), 1)
+            for start in range(0, len(rows), size):
+                query = InsertQuery(
+                    model, ignore_conflicts=ignore_conflicts
+                )
+                query.insert_values(
+                    fields, rows[start:start + size], raw=True
+                )
+                compiler = query.get_compiler(connection=connection)
+                for statement, params in compiler.as_sql():
+                    cursor.execute(statement, params)
+                    inserted += cursor.rowcount
+    return inserted
+
+
+def read_rows(path):
+    """
+    Строки файла JSONL или CSV (в том числе .gz) по одной: (номер
+    строки, словарь). Битая строка JSON приходит как RowError.
+    """
+    gzipped = path.endswith('.gz')
+    name = path[:-3] if gzipped else path
+    opener = gzip.open if gzipped else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as file_:
+        if name.endswith('.csv'):
+            yield from enumerate(csv.DictReader(file_), start=2)
+            return
+        for number, line in enumerate(file_, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                row = RowError(f'битый JSON: {error}')
+            if not isinstance(row, (dict, RowError)):
+                row = RowError('ожидался объект JSON')
+            yield number, row
+
+
+@contextmanager
+def deferred_indexes(models):
+    """
+    Удалить вторичные индексы таблиц на время загрузки и создать их
+    заново в конце: один проход по готовой таблице быстрее, чем
+    обновление индексов на каждую строку. Уникальные индексы
+    остаются -- на них держится пропуск дубликатов. Работает
+    на SQLite и PostgreSQL, на остальных базах ничего не делает.
+    """
+    tables = [model._meta.db_table for model in models]
+    indexes = []
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index' "
+                'AND sql IS NOT NULL AND tbl_name IN '
+                f'({", ".join(["%s"] * len(tables))})',
+                tables
+            )
+            indexes = cursor.fetchall()
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT indexname, indexdef FROM pg_indexes '
+                'WHERE tablename = ANY(%s)',
+                [tables]
+            )
+            indexes = cursor.fetchall()
+        indexes = [
+            (name, sql) for name, sql in indexes
+            if not sql.upper().startswith('CREATE UNIQUE')
+        ]
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for _, sql in indexes:
+                cursor.execute(sql)
+
+
+def _clean(model, name, value):
+    # Проверки поля без запросов к базе: длина, формат, тип.
+    try:
+        return model._meta.get_field(name).clean(value, None)
+    except ValidationError as error:
+        raise RowError(f'{name}: {" ".join(error.messages)}')
+
+
+def _required(row, name):
+    value = row.get(name)
+    if value in (None, ''):
+        raise RowError(f'{name}: обязательное поле')
+    return value
+
+
+def _date(row, name, default):
+    value = row.get(name)
+    if not value:
+        return default
+    date = parse_datetime(str(value))
+    if date is None:
+        raise RowError(f'{name}: неверная дата {value!r}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def _lookup(queryset, field, values):
+    """{значение поля: pk} пачками по LOOKUP_SIZE значений."""
+    values = sorted({value for value in values if value not in (None, '')})
+    found = {}
+    for start in range(0, len(values), LOOKUP_SIZE):
+        found.update(queryset.filter(**{
+            f'{field}__in': values[start:start + LOOKUP_SIZE]
+        }).values_list(field, 'pk'))
+    return found
+
+
+def _reference(mapping, row, name, required=True):
+    value = row.get(name)
+    if value in (None, ''):
+        if required:
+            raise RowError(f'{name}: обязательное поле')
+        return None
+    try:
+        return mapping[value]
+    except KeyError:
+        raise RowError(f'{name}: {value!r} не найден')
+
+
+class Importer:
+    """
+    Потоковая загрузка пользователей, групп, постов, комментариев
+    и подписок пачками через bulk_create: по несколько запросов
+    на пачку вместо нескольких на строку. Ссылки на пользователей
+    (username), группы (slug) и посты (id) разрешаются одним запросом
+    на пачку. Строки с ошибками пропускаются и попадают в errors;
+    после max_errors загрузка прерывается. Сигналы не вызываются,
+    поэтому счётчики, ленты подписок и поисковый индекс
+    пересчитываются в finish(): для затронутых загрузкой пользователей
+    и постов, а с full_rebuild -- целиком.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, max_errors=MAX_ERRORS,
+                 full_rebuild=False):
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.full_rebuild = full_rebuild
+        self.errors = []
+        self.loaded = {}
+        self.touched_feeds = {feeds.ALL_POSTS}
+        # Что затронула загрузка: по этим id finish() пересчитывает
+        # производные данные.
+        self.user_ids = set()
+        self.author_ids = set()
+        self.reader_ids = set()
+        self.commented_post_ids = set()
+        self.post_ids = set()
+        self.images = set()
+        # Посты с id больше этого появились во время загрузки.
+        self.last_post_pk = None
+
+    def error(self, kind, number, message):
+        self.errors.append((kind, number, message))
+        if len(self.errors) > self.max_errors:
+            raise ImportAborted(
+                f'Больше {self.max_errors} ошибок, загрузка прервана'
+            )
+
+    def load(self, kind, rows):
+        """Загрузить строки (номер, словарь) одного вида."""
+        model, prepare = {
+            'users': (User, self.users),
+            'groups': (Group, self.groups),
+            'posts': (Post, self.posts),
+            'comments': (Comment, self.comments),
+            'follows': (Follow, self.follows),
+        }[kind]
+        for batch in chunked(rows, self.batch_size):
+            build = prepare([
+                row for _, row in batch if not isinstance(row, RowError)
+            ])
+            objects = []
+            for number, row in batch:
+                try:
+                    if isinstance(row, RowError):
+                        raise row
+                    objects.append(build(row))
+                except RowError as error:
+                    self.error(kind, number, str(error))
+            # Даты из данных сохраняются как есть (insert_rows);
+            # дубликаты пропускаются и не считаются.
+            with transaction.atomic():
+                inserted = insert_rows(model, objects, ignore_conflicts=True)
+            self.loaded[kind] = self.loaded.get(kind, 0) + inserted
+        return self.loaded.get(kind, 0)
+
+    # Методы ниже готовят пачку (разрешают ссылки одним запросом)
+    # и возвращают функцию, которая строит объект из строки.
+
+    def users(self, rows):
+        def build(row):
+            return User(
+                username=_clean(User, 'username', _required(row, 'username')),
+                first_name=_clean(
+                    User, 'first_name', row.get('first_name') or ''
+                ),
+                last_name=_clean(
+                    User, 'last_name', row.get('last_name') or ''
+                ),
+                email=_clean(User, 'email', row.get('email') or ''),
+                # Без пароля войти нельзя, пока его не зададут.
+                password=row.get('password') or '!',
+            )
+        return build
+
+    def groups(self, rows):
+        def build(row):
+            return Group(
+                slug=_clean(Group, 'slug', _required(row, 'slug')),
+                title=_clean(Group, 'title', _required(row, 'title')),
+                description=row.get('description') or '',
+            )
+        return build
+
+    def posts(self, rows):
+        users = _lookup(User.objects, 'username', [
+            row.get('author') for row in rows
+        ])
+        groups = _lookup(Group.objects, 'slug', [
+            row.get('group') for row in rows
+        ])
+        if self.last_post_pk is None:
+            self.last_post_pk = Post.objects.aggregate(
+                last=Max('pk')
+            )['last'] or 0
+        now = timezone.now()
+
+        def build(row):
+            post = Post(
+                text=_required(row, 'text'),
+                author_id=_reference(users, row, 'author'),
+                group_id=_reference(groups, row, 'group', required=False),
+                image=_clean(Post, 'image', row.get('image') or ''),
+                pub_date=_date(row, 'pub_date', now),
+                updated=now,
+            )
+            if row.get('id'):
+                post.pk = _clean(Post, 'id', row['id'])
+                self.post_ids.add(post.pk)
+            self.user_ids.add(post.author_id)
+            self.author_ids.add(post.author_id)
+            self.images.add(post.image.name)
+            self.touched_feeds.add(feeds.author_feed(post.author_id))
+            if post.group_id:
+                self.touched_feeds.add(feeds.group_feed(post.group_id))
+            return post
+        return build
+
+    def comments(self, rows):
+        users = _lookup(User.objects, 'username', [
+            row.get('author') for row in rows
+        ])
+        # id поста в JSON -- число, в CSV -- строка.
+        posts = {
+            str(pk): pk for pk in _lookup(Post.objects, 'pk', [
+                int(row['post']) for row in rows
+                if str(row.get('post', '')).isdigit()
+            ])
+        }
+        now = timezone.now()
+
+        def build(row):
+            comment = Comment(
+                post_id=_reference(
+                    posts, {'post': str(row.get('post') or '')}, 'post'
+                ),
+                author_id=_reference(users, row, 'author'),
+                text=_required(row, 'text'),
+                created=_date(row, 'created', now),
+            )
+            self.commented_post_ids.add(comment.post_id)
+            return comment
+        return build
+
+    def follows(self, rows):
+        users = _lookup(User.objects, 'username', [
+            row.get(name) for row in rows for name in ('user', 'author')
+        ])
+
+        def build(row):
+            follow = Follow(
+                user_id=_reference(users, row, 'user'),
+                author_id=_reference(users, row, 'author'),
+            )
+            if follow.user_id == follow.author_id:
+                raise RowError('нельзя подписаться на самого себя')
+            self.user_ids.update((follow.user_id, follow.author_id))
+            self.reader_ids.add(follow.user_id)
+            self.touched_feeds.add(feeds.follow_feed(follow.user_id))
+            return follow
+        return build
+
+    def imported_posts(self):
+        """
+        Выборки загруженных постов: с id больше прежнего максимума
+        и с явно заданными id меньше него.
+        """
+        if self.last_post_pk is None:
+            return []
+        explicit = sorted(
+            pk for pk in self.post_ids if pk <= self.last_post_pk
+        )
+        return [
+            Post.objects.filter(pk__gt=self.last_post_pk),
+            *(
+                Post.objects.filter(pk__in=explicit[start:start + LOOKUP_SIZE])
+                for start in range(0, len(explicit), LOOKUP_SIZE)
+            ),
+        ]
+
+    def readers(self):
+        """Читатели, чьи ленты подписок изменила загрузка."""
+        readers = set(self.reader_ids)
+        authors = sorted(self.author_ids)
+        for start in range(0, len(authors), LOOKUP_SIZE):
+            readers.update(Follow.objects.filter(
+                author_id__in=authors[start:start + LOOKUP_SIZE]
+            ).values_list('user_id', flat=True))
+        return readers
+
+    def finish(self):
+        """Пересчитать то, что при обычном сохранении делают сигналы."""
+        if not any(self.loaded.values()):
+            return
+        posts = self.loaded.get('posts')
+        if self.full_rebuild:
+            counters.recount_all()
+            if posts:
+                blobs.recount()
+                search.rebuild_index()
+            if posts or self.loaded.get('follows'):
+                timeline.rebuild()
+        else:
+            counters.recount(self.user_ids, self.commented_post_ids)
+            if posts:
+                blobs.recount(self.images)
+                for queryset in self.imported_posts():
+                    search.index_queryset(queryset)
+            if posts or self.loaded.get('follows'):
+                timeline.rebuild(self.readers())
+        feeds.reset_totals(self.touched_feeds)
+        # Комментарии и счётчики меняют карточки во всех лентах.
+        feeds.bump([feeds.SITE, *self.touched_feeds])
+
+
+def import_files(paths, batch_size=BATCH_SIZE, max_errors=MAX_ERRORS,
+                 defer=False, full_rebuild=False, log=print):
+    """
+    Загрузить файлы {вид: путь} в порядке KINDS. С defer вторичные
+    индексы создаются, а внешние ключи проверяются после загрузки.
+    С full_rebuild счётчики, поиск и ленты подписок пересчитываются
+    целиком, а не только для затронутых загрузкой данных.
+    """
+    importer = Importer(batch_size, max_errors, full_rebuild)
+    models = [User, Group, Post, Comment, Follow]
+    context = deferred_indexes(models) if defer else nullcontext()
+    with context:
+        if defer:
+            checks = connection.constraint_checks_disabled()
+        else:
+            checks = nullcontext()
+        with checks:
+            for kind in KINDS:
+                if paths.get(kind):
+                    loaded = importer.load(kind, read_rows(paths[kind]))
+                    log(f'{kind}: {loaded}')
+        if defer:
+            connection.check_constraints(
+                table_names=[model._meta.db_table for model in models]
+            )
+    importer.finish()
+    return importer
@@ -0,0 +1,135 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает ленты и страницы постов через тестовый клиент и выводит '
+        'p50/p95/p99 задержки, пропускную способность и число '
+        'SQL-запросов. Данные готовит seed_benchmark.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=benchmark.SCENARIOS,
+            help='Сценарий; по умолчанию все.'
+        )
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--threads', type=int, default=1)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--baseline',
+            help='JSON прошлого прогона: вывести разницу с ним.'
+        )
+        parser.add_argument(
+            '--save-baseline',
+            help='Сохранить результаты в JSON.'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=benchmark.REGRESSION_THRESHOLD,
+            help='Ухудшение, которое считается регрессией (0.1 -- 10%%).'
+        )
+        parser.add_argument(
+            '--contention',
+            action='store_true',
+            help=(
+                'Вместо сценариев: одновременные чтения и записи в SQLite '
+                'с журналом отката и с SQLITE_PRAGMAS.'
+            )
+        )
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=5.0,
+            help='Секунд на каждый режим.'
+        )
+
+    def handle(self, *args, **options):
+        if options['contention']:
+            return self.contention(options)
+        try:
+            results = benchmark.run(
+                scenarios=options['scenario'] or benchmark.SCENARIOS,
+                requests=options['requests'],
+                warmup=options['warmup'],
+                threads=options['threads'],
+                random_seed=options['seed']
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(
+            f'{"сценарий":<14}{"запросов":>9}{"ошибок":>8}{"rps":>9}'
+            f'{"p50, мс":>10}{"p95, мс":>10}{"p99, мс":>10}{"SQL":>7}'
+        )
+        for scenario, metrics in results.items():
+            self.stdout.write(
+                f'{scenario:<14}{metrics["requests"]:>9}'
+                f'{metrics["errors"]:>8}{metrics["rps"]:>9}'
+                f'{metrics["p50"]:>10}{metrics["p95"]:>10}'
+                f'{metrics["p99"]:>10}{metrics["queries"]:>7}'
+            )
+        if options['save_baseline']:
+            benchmark.save_baseline(options['save_baseline'], results)
+        if not options['baseline']:
+            return
+        rows = benchmark.compare(
+            results,
+            benchmark.load_baseline(options['baseline']),
+            options['threshold']
+        )
+        regressions = []
+        for scenario, metric, before, after, change, regressed in rows:
+            line = f'{scenario:<14}{metric:<8}{before:>10} -> {after:<10}'
+            line += f'{change:+.1%}'
+            if regressed:
+                regressions.append(f'{scenario} {metric}')
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+        if regressions:
+            raise CommandError(f'Регрессии: {", ".join(regressions)}')
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
+
+    def contention(self, options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Сравнение режимов есть только для SQLite')
+        profiles = {
+            'rollback': benchmark.ROLLBACK_PRAGMAS,
+            'tuned': settings.SQLITE_PRAGMAS,
+        }
+        results = {}
+        try:
+            for name, pragmas in profiles.items():
+                results[name] = benchmark.contention(
+                    pragmas,
+                    readers=options['readers'],
+                    writers=options['writers'],
+                    duration=options['duration'],
+                    random_seed=options['seed']
+                )
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(
+            f'{"режим":<10}{"чтений/с":>10}{"записей/с":>11}'
+            f'{"p95 чт., мс":>13}{"p95 зап., мс":>14}{"ошибок":>8}'
+        )
+        for name, metrics in results.items():
+            self.stdout.write(
+                f'{name:<10}{metrics["reads"]:>10}{metrics["writes"]:>11}'
+                f'{metrics["read_p95"]:>13}{metrics["write_p95"]:>14}'
+                f'{metrics["errors"]:>8}'
+            )
+        before, after = results['rollback'], results['tuned']
+        for metric in ('reads', 'writes'):
+            if before[metric]:
+                change = after[metric] / before[metric] - 1
+                self.stdout.write(f'{metric}: {change:+.1%}')
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from posts import blobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет файлы картинок, на которые не ссылается ни один пост, '
+        'вместе с их миниатюрами и вариантами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=int(blobs.GC_GRACE_PERIOD.total_seconds()),
+            help='Сколько секунд файл должен пробыть без ссылок.'
+        )
+        parser.add_argument(
+            '--recount',
+            action='store_true',
+            help='Сначала пересчитать ссылки по постам.'
+        )
+
+    def handle(self, *args, grace, recount, **options):
+        if recount:
+            blobs.recount()
+        removed = blobs.collect(timedelta(seconds=grace))
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено файлов: {len(removed)}'
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import explain
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN для запросов лент и страниц постов и находит '
+        'полные сканы таблиц и сортировки без индекса. С -v 2 выводит '
+        'планы целиком.'
+    )
+
+    def handle(self, *args, verbosity, **options):
+        failed = []
+        for name, queryset, allowed in explain.view_queries():
+            plan = queryset.explain()
+            found = [
+                (kind, table) for kind, table in explain.problems(plan)
+                if kind not in allowed
+            ]
+            if found:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(name + ': ' + ', '.join(
+                    f'{kind} {table}' for kind, table in found
+                )))
+            else:
+                self.stdout.write(f'{name}: ok')
+            if verbosity > 1 or found:
+                self.stdout.write(plan)
+        if failed:
+            raise CommandError(f'Запросы без индекса: {", ".join(failed)}')
+        self.stdout.write(self.style.SUCCESS('Все запросы идут по индексам'))
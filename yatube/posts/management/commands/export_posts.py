@@ -0,0 +1,70 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import exporter
+from posts.models import Group
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает все посты автора или группы в JSONL или CSV '
+        '(формат import_data), при необходимости со сжатием gzip.'
+    )
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group()
+        source.add_argument('--author', help='username автора.')
+        source.add_argument('--group', help='slug группы.')
+        parser.add_argument(
+            '--format',
+            choices=list(exporter.FORMATS),
+            default='jsonl'
+        )
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument(
+            '--output',
+            help='Файл выгрузки; по умолчанию стандартный вывод.'
+        )
+        parser.add_argument(
+            '--base-url',
+            default='',
+            help='Адрес сайта для ссылок на картинки, например '
+                 'https://yatube.example.'
+        )
+
+    def handle(self, *args, **options):
+        if not options['author'] and not options['group']:
+            raise CommandError('Укажите --author или --group.')
+        if options['author']:
+            owner = User.objects.filter(username=options['author']).first()
+        else:
+            owner = Group.objects.filter(slug=options['group']).first()
+        if owner is None:
+            raise CommandError('Автор или группа не найдены.')
+        base_url = options['base_url'].rstrip('/')
+        chunks = exporter.export(
+            owner.posts.all(),
+            options['format'],
+            options['gzip'],
+            media_url=lambda url: base_url + url
+        )
+        if options['output']:
+            output = open(options['output'], 'wb')
+        else:
+            output = sys.stdout.buffer
+        size = 0
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                size += len(chunk)
+        finally:
+            if options['output']:
+                output.close()
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Выгружено в {options["output"]}: {size} байт'
+            ))
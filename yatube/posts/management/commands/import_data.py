@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from posts import importer
+
+MAX_SHOWN_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает пользователей, группы, посты, комментарии и подписки '
+        'из файлов JSONL или CSV (можно .gz) пачками через bulk_create. '
+        'Пользователи и подписки ссылаются на username, посты -- '
+        'на username автора и slug группы, комментарии -- на id поста.'
+    )
+
+    def add_arguments(self, parser):
+        for kind in importer.KINDS:
+            parser.add_argument(f'--{kind}', metavar='FILE')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=importer.BATCH_SIZE
+        )
+        parser.add_argument(
+            '--max-errors',
+            type=int,
+            default=importer.MAX_ERRORS,
+            help='Прервать загрузку после стольких строк с ошибками.'
+        )
+        parser.add_argument(
+            '--defer',
+            action='store_true',
+            help=(
+                'Создать вторичные индексы и проверить внешние ключи '
+                'после загрузки. Если загрузка оборвётся, индексы '
+                'придётся создать заново (migrate не восстановит).'
+            )
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help=(
+                'Пересчитать счётчики, поисковый индекс и ленты подписок '
+                'целиком, а не только для загруженных данных.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        paths = {kind: options[kind] for kind in importer.KINDS}
+        if not any(paths.values()):
+            raise CommandError('Укажите хотя бы один файл.')
+        try:
+            result = importer.import_files(
+                paths,
+                batch_size=options['batch_size'],
+                max_errors=options['max_errors'],
+                defer=options['defer'],
+                full_rebuild=options['rebuild'],
+                log=self.stdout.write
+            )
+        except (importer.ImportAborted, IntegrityError) as error:
+            raise CommandError(error)
+        for kind, number, message in result.errors[:MAX_SHOWN_ERRORS]:
+            self.stderr.write(f'{kind}, строка {number}: {message}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено строк: {sum(result.loaded.values())}, '
+            f'с ошибками: {len(result.errors)}'
+        ))
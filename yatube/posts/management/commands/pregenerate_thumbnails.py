@@ -0,0 +1,53 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails, variants
+from posts.models import Post
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт недостающие миниатюры и варианты картинок всех постов '
+        'в нескольких процессах.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=multiprocessing.cpu_count(),
+            help='Количество процессов.'
+        )
+
+    def missing(self):
+        names = sorted(set(
+            Post.objects.exclude(image='').values_list('image', flat=True)
+        ))
+        missing = variants.missing(names)
+        for start in range(0, len(names), BATCH_SIZE):
+            batch = names[start:start + BATCH_SIZE]
+            ready = thumbnails.lookup_many(batch)
+            missing.update(name for name in batch if name not in ready)
+        return sorted(missing)
+
+    def handle(self, *args, workers, **options):
+        names = self.missing()
+        if workers > 1 and len(names) > 1:
+            with ProcessPoolExecutor(
+                workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup
+            ) as executor:
+                done = list(executor.map(thumbnails.generate, names))
+        else:
+            done = [thumbnails.generate(name) for name in names]
+        for name in done:
+            thumbnails.refresh_posts(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {len(done)}'
+        ))
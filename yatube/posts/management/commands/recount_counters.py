@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount_all
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики постов, подписчиков, подписок '
+        'и комментариев по фактическим данным.'
+    )
+
+    def handle(self, *args, **options):
+        users, posts = recount_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано пользователей: {users}, постов: {posts}'
+        ))
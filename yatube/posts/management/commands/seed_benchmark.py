@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими данными для нагрузочного '
+        'тестирования: пользователи bench_*, посты, подписки '
+        'и комментарии со степенным распределением.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument(
+            '--follows',
+            type=int,
+            default=20,
+            help='Среднее число подписок пользователя.'
+        )
+        parser.add_argument('--comments', type=int, default=500000)
+        parser.add_argument(
+            '--images',
+            type=float,
+            default=0.1,
+            help='Доля постов с картинкой.'
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--flush',
+            action='store_true',
+            help='Удалить данные прошлого заполнения.'
+        )
+
+    def handle(self, *args, **options):
+        if options['flush']:
+            deleted = benchmark.flush()
+            self.stdout.write(f'Удалено объектов: {deleted}')
+        try:
+            user_ids = benchmark.seed(
+                users=options['users'],
+                posts=options['posts'],
+                follows=options['follows'],
+                comments=options['comments'],
+                image_share=options['images'],
+                random_seed=options['seed'],
+                log=self.stdout.write
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные для нагрузки готовы: {len(user_ids)} пользователей'
+        ))
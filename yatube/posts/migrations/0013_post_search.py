@@ -0,0 +1,204 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:30
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Снимок posts.search на момент миграции: миграция не должна зависеть
+# от того, как модуль поиска изменится потом.
+FTS_TABLE = 'posts_post_search'
+TERM_LENGTH = 64
+WORD_RE = re.compile(r'\w+')
+STOP_WORDS = frozenset((
+    'и', 'в', 'во', 'не', 'что', 'он', 'на', 'я', 'с', 'со', 'как', 'а',
+    'то', 'все', 'она', 'так', 'его', 'но', 'да', 'ты', 'к', 'у', 'же',
+    'вы', 'за', 'бы', 'по', 'ее', 'мне', 'было', 'вот', 'от', 'меня',
+    'о', 'из', 'ему', 'ли', 'если', 'или', 'ни', 'быть', 'был', 'до',
+    'нас', 'для', 'мы', 'их', 'это', 'the', 'a', 'an', 'and', 'or', 'of',
+    'to', 'in', 'is', 'it',
+))
+
+
+def _endings(endings, after_a=()):
+    """
+    Группа окончаний стеммера Snowball: сначала длинные. Окончания
+    after_a отрезаются, только если перед ними стоит а или я.
+    """
+    return (
+        tuple(sorted(endings + after_a, key=len, reverse=True)),
+        frozenset(after_a),
+    )
+
+
+PERFECTIVE_GERUND = _endings(
+    ('ившись', 'ывшись', 'ивши', 'ывши', 'ив', 'ыв'),
+    ('вшись', 'вши', 'в')
+)
+ADJECTIVE = _endings((
+    'ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие', 'ые', 'ое',
+    'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом', 'их', 'ых', 'ую',
+    'юю', 'ая', 'яя', 'ою', 'ею',
+))
+PARTICIPLE = _endings(('ивш', 'ывш', 'ующ'), ('ем', 'нн', 'вш', 'ющ', 'щ'))
+REFLEXIVE = _endings(('ся', 'сь'))
+VERB = _endings(
+    (
+        'ейте', 'уйте', 'ила', 'ыла', 'ена', 'ите', 'или', 'ыли', 'ило',
+        'ыло', 'ено', 'ует', 'уют', 'ены', 'ить', 'ыть', 'ишь', 'ей', 'уй',
+        'ил', 'ыл', 'им', 'ым', 'ен', 'ят', 'ит', 'ыт', 'ую', 'ю',
+    ),
+    (
+        'ете', 'йте', 'ешь', 'нно', 'ла', 'на', 'ли', 'ем', 'ло', 'но',
+        'ет', 'ют', 'ны', 'ть', 'й', 'л', 'н',
+    )
+)
+NOUN = _endings((
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ев', 'ов', 'ие',
+    'ье', 'еи', 'ии', 'ей', 'ой', 'ий', 'ям', 'ем', 'ам', 'ом', 'ах',
+    'ях', 'ию', 'ью', 'ия', 'ья', 'а', 'е', 'и', 'й', 'о', 'у', 'ы', 'ь',
+    'ю', 'я',
+))
+SUPERLATIVE = _endings(('ейше', 'ейш'))
+DERIVATIONAL = _endings(('ость', 'ост'))
+VOWELS = 'аеиоуыэюя'
+CYRILLIC_RE = re.compile('[а-я]')
+
+
+def _remove(word, group):
+    endings, after_a = group
+    for ending in endings:
+        if word.endswith(ending):
+            stem = word[:-len(ending)]
+            if ending in after_a and not stem.endswith(('а', 'я')):
+                return word, False
+            return stem, True
+    return word, False
+
+
+def _regions(word):
+    """Начала областей RV и R2 стеммера Snowball."""
+    rv = r1 = r2 = len(word)
+    for index, char in enumerate(word):
+        if char in VOWELS:
+            rv = index + 1
+            break
+    for index in range(1, len(word)):
+        if word[index - 1] in VOWELS and word[index] not in VOWELS:
+            r1 = index + 1
+            break
+    for index in range(r1 + 1, len(word)):
+        if word[index - 1] in VOWELS and word[index] not in VOWELS:
+            r2 = index + 1
+            break
+    return rv, r2
+
+
+def stem(word):
+    """Русский стеммер Snowball; слова без кириллицы не меняются."""
+    if not CYRILLIC_RE.search(word):
+        return word
+    rv, r2 = _regions(word)
+    head, tail = word[:rv], word[rv:]
+    tail, removed = _remove(tail, PERFECTIVE_GERUND)
+    if not removed:
+        tail, _ = _remove(tail, REFLEXIVE)
+        tail, removed = _remove(tail, ADJECTIVE)
+        if removed:
+            tail, _ = _remove(tail, PARTICIPLE)
+        else:
+            tail, removed = _remove(tail, VERB)
+            if not removed:
+                tail, _ = _remove(tail, NOUN)
+    if tail.endswith('и'):
+        tail = tail[:-1]
+    word = head + tail
+    if len(word) > r2:
+        derived, removed = _remove(word[r2:], DERIVATIONAL)
+        word = word[:r2] + derived
+    tail = word[rv:]
+    tail, removed = _remove(tail, SUPERLATIVE)
+    if tail.endswith('нн'):
+        tail = tail[:-1]
+    elif not removed and tail.endswith('ь'):
+        tail = tail[:-1]
+    return head + tail
+
+
+def tokenize(text):
+    """Основы слов текста: нижний регистр, ё -> е, без стоп-слов."""
+    words = WORD_RE.findall(text.lower().replace('ё', 'е'))
+    return [
+        stem(word) for word in words
+        if len(word) > 1 and word not in STOP_WORDS
+    ]
+
+
+def create_fts_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        options = {row[0] for row in cursor.fetchall()}
+        if 'ENABLE_FTS5' not in options:
+            return
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(terms)'
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def fill_index(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    PostTerm = apps.get_model('posts', 'PostTerm')
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        fts5 = FTS_TABLE in connection.introspection.table_names(cursor)
+        for post_id, text in Post.objects.values_list('pk', 'text'):
+            terms = tokenize(text)
+            if fts5:
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE} (rowid, terms) '
+                    'VALUES (%s, %s)',
+                    [post_id, ' '.join(terms)]
+                )
+                continue
+            PostTerm.objects.bulk_create([
+                PostTerm(post_id=post_id, term=term[:TERM_LENGTH],
+                         weight=terms.count(term) / len(terms))
+                for term in set(terms)
+            ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Основа слова')),
+                ('weight', models.FloatField(verbose_name='Вес')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Слово поискового индекса',
+                'verbose_name_plural': 'Поисковый индекс',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='postterm',
+            constraint=models.UniqueConstraint(fields=('term', 'post'), name='unique_post_term'),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+        migrations.RunPython(fill_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,111 @@
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from core.replicas import sees_own_writes
+from core.stampede import remember
+
+from . import feeds
+
+CACHEABLE_METHODS = ('GET', 'HEAD')
+
+
+def page_key(request, version=None):
+    """
+    Ключ страницы для поколений лент version; без version -- ключ
+    последней сохранённой копии страницы любого поколения.
+    """
+    # Параметры сортируются: ?a=1&b=2 и ?b=2&a=1 -- одна страница.
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    raw = f'{request.path}?{query}'
+    if version is None:
+        return 'stale:page:' + hashlib.md5(raw.encode()).hexdigest()
+    raw += f'|{version}'
+    return 'page:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def _from_cache(entry):
+    content, content_type, etag = entry
+    response = HttpResponse(content, content_type=content_type)
+    response['ETag'] = etag
+    return response
+
+
+def cache_anonymous_page(depends_on):
+    """
+    Кешировать страницу целиком для анонимных посетителей.
+
+    depends_on(request, *args, **kwargs) возвращает ленты (posts.feeds),
+    от которых зависит страница, или None, если страницы нет. Ключ
+    кеша -- адрес, параметры и поколения этих лент, поэтому запись
+    устаревает сразу после изменения постов, комментариев или подписок,
+    а пересчитывает её один запрос (core.stampede.remember).
+    Ответ получает ETag по содержимому и Last-Modified по времени
+    смены поколений, а повторный запрос с If-None-Match или
+    If-Modified-Since -- 304 без тела.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            request.page_cache_hit = False
+            if (not settings.PAGE_CACHE_TIMEOUT
+                    or request.method not in CACHEABLE_METHODS
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            dependencies = depends_on(request, *args, **kwargs)
+            if dependencies is None:
+                return view(request, *args, **kwargs)
+            rendered = None
+            version = feeds.get_version(dependencies)
+
+            def render_page():
+                nonlocal rendered
+                rendered = view(request, *args, **kwargs)
+                if rendered.status_code != 200 or rendered.streaming:
+                    return None
+                rendered['ETag'] = quote_etag(
+                    hashlib.md5(rendered.content).hexdigest()
+                )
+                return (
+                    rendered.content,
+                    rendered['Content-Type'],
+                    rendered['ETag'],
+                )
+
+            # Страницу пересчитывает один запрос, остальные тем временем
+            # получают прошлую копию (core.stampede).
+            entry = remember(
+                page_key(request, version),
+                render_page,
+                settings.PAGE_CACHE_TIMEOUT,
+                stale_key=page_key(request),
+                stale_ok=not sees_own_writes(request)
+            )
+            if entry is None:
+                return rendered
+            if rendered is None:
+                request.page_cache_hit = True
+                response = _from_cache(entry)
+            else:
+                response = rendered
+            # Время не хранится в записи: копия, сохранённая в ту же
+            # секунду, что и смена поколения, получит его позже.
+            last_modified = feeds.last_modified(version)
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            # Браузер хранит страницу, но перед показом сверяет ETag.
+            response['Cache-Control'] = 'no-cache'
+            patch_vary_headers(response, ['Cookie'])
+            return get_conditional_response(
+                request,
+                etag=response['ETag'],
+                last_modified=last_modified,
+                response=response
+            )
+        return wrapper
+    return decorator
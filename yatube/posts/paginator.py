@@ -0,0 +1,226 @@
+from collections import namedtuple
+from math import ceil
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+# Глубже этой страницы ?page=N не обслуживаем: OFFSET растёт линейно.
+MAX_OFFSET_PAGE = 50
+# Сколько номеров страниц показывать по обе стороны от текущей.
+PAGE_WINDOW = 2
+
+FORWARD = 'n'
+BACKWARD = 'p'
+LAST = 'l'
+
+PageLink = namedtuple('PageLink', ('number', 'query'))
+
+
+def encode_cursor(number, direction, date=None, pk=None):
+    key = f'{date.isoformat()}|{pk}' if date is not None else '|'
+    raw = f'{number}|{direction}|{key}'
+    return urlsafe_base64_encode(force_bytes(raw))
+
+
+def decode_cursor(cursor):
+    """Вернуть (номер, направление, дата, id) или None для битого курсора."""
+    try:
+        number, direction, date, pk = force_str(
+            urlsafe_base64_decode(cursor)
+        ).split('|')
+        number = int(number)
+        if direction == LAST:
+            date, pk = None, None
+        else:
+            date, pk = parse_datetime(date), int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+    if number < 1 or direction not in (FORWARD, BACKWARD, LAST):
+        return None
+    if direction != LAST and date is None:
+        return None
+    return number, direction, date, pk
+
+
+class CursorPaginator(Paginator):
+    """
+    Постраничный вывод по ключу (дата, id) вместо OFFSET.
+
+    Общее количество записей не считается: о следующей странице
+    узнаём, запросив на одну запись больше, чем помещается на страницу.
+    Старые ссылки ?page=N обслуживаются через OFFSET до MAX_OFFSET_PAGE.
+    count_total -- необязательная функция, возвращающая приблизительное
+    число записей (например, из кеша); нужна только для номера последней
+    страницы и вызывается, лишь когда следующая страница существует.
+    """
+
+    def __init__(self, object_list, per_page, date_field='pub_date',
+                 count_total=None):
+        self.date_field = date_field
+        self.count_total = count_total
+        super().__init__(
+            object_list.order_by(f'-{date_field}', '-pk'),
+            per_page
+        )
+        self.number = 1
+        self.has_more = False
+        self.rows_on_page = 0
+
+    def get_page(self, number=None, cursor=None):
+        position = decode_cursor(cursor) if cursor else None
+        if position is not None:
+            return self.page_after(*position)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            number = 1
+        if not 1 <= number <= MAX_OFFSET_PAGE:
+            number = 1
+        return self.page(number)
+
+    def page(self, number):
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            return self.page(1)
+        return self._build_page(rows, number)
+
+    def page_after(self, number, direction, date, pk):
+        if direction == LAST:
+            # На последней странице -- остаток записей, как при счёте
+            # страниц от первой: иначе она повторяла бы часть
+            # предпоследней, на которую ведёт previous_cursor.
+            size = self.per_page
+            total = self.count_total() if self.count_total else None
+            if total:
+                number = ceil(total / self.per_page)
+                size = total - (number - 1) * self.per_page
+            rows = list(
+                self.object_list.order_by(self.date_field, 'pk')[:size]
+            )
+            rows.reverse()
+            return self._build_page(rows, number, has_more=False)
+        if direction == FORWARD:
+            rows = list(
+                self.object_list.filter(self._seek(date, pk, FORWARD))[
+                    :self.per_page + 1
+                ]
+            )
+            if not rows and number > 1:
+                return self.page(1)
+            return self._build_page(rows, number)
+        rows = list(
+            self.object_list.filter(
+                self._seek(date, pk, BACKWARD)
+            ).order_by(self.date_field, 'pk')[:self.per_page + 1]
+        )
+        if len(rows) <= self.per_page:
+            # Дошли до начала ленты: отдаём первую страницу целиком.
+            return self.page(1)
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return self._build_page(rows, max(number, 2), has_more=True)
+
+    def _seek(self, date, pk, direction):
+        lookup = 'lt' if direction == FORWARD else 'gt'
+        return (
+            Q(**{f'{self.date_field}__{lookup}': date})
+            | Q(**{self.date_field: date, f'pk__{lookup}': pk})
+        )
+
+    def _build_page(self, rows, number, has_more=None):
+        if has_more is None:
+            has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        self.number = number
+        self.has_more = has_more
+        self.rows_on_page = len(rows)
+        page = self._get_page(rows, number, self)
+        self.current_page = page
+        page.next_cursor = None
+        page.previous_cursor = None
+        if rows and has_more:
+            page.next_cursor = self._cursor(rows[-1], number + 1, FORWARD)
+        if rows and number > 1:
+            page.previous_cursor = self._cursor(
+                rows[0], number - 1, BACKWARD
+            )
+        return page
+
+    def _cursor(self, row, number, direction):
+        return encode_cursor(
+            number, direction, getattr(row, self.date_field), row.pk
+        )
+
+    @cached_property
+    def total(self):
+        if not self.has_more or self.count_total is None:
+            return None
+        return self.count_total()
+
+    @property
+    def num_pages(self):
+        if not self.has_more:
+            return self.number
+        if self.total is None:
+            return self.number + 1
+        return max(self.number + 1, ceil(self.total / self.per_page))
+
+    @property
+    def count(self):
+        # Без COUNT(*): полные предыдущие страницы, текущая и хотя бы
+        # одна запись следующей, либо оценка из count_total.
+        known = (
+            (self.number - 1) * self.per_page
+            + self.rows_on_page
+            + int(self.has_more)
+        )
+        return max(known, self.total or 0)
+
+    @property
+    def page_links(self):
+        """
+        Окно номеров страниц: первая, последняя и PAGE_WINDOW вокруг
+        текущей. None обозначает пропуск. Глубокие страницы доступны
+        только соседям текущей (по курсору) и как последняя.
+        """
+        page = self.current_page
+        last = self.num_pages
+        links = {
+            number: PageLink(number, f'page={number}')
+            for number in range(
+                max(1, self.number - PAGE_WINDOW),
+                min(last, self.number + PAGE_WINDOW) + 1
+            )
+            if number <= MAX_OFFSET_PAGE
+        }
+        links[1] = PageLink(1, 'page=1')
+        links[self.number] = PageLink(self.number, '')
+        if page.previous_cursor:
+            links.setdefault(
+                self.number - 1,
+                PageLink(self.number - 1, f'cursor={page.previous_cursor}')
+            )
+        if page.next_cursor:
+            links.setdefault(
+                self.number + 1,
+                PageLink(self.number + 1, f'cursor={page.next_cursor}')
+            )
+        links.setdefault(last, PageLink(last, self.last_page_query))
+        result = []
+        for number in sorted(links):
+            if result and number - result[-1].number > 1:
+                result.append(None)
+            result.append(links[number])
+        return result
+
+    @property
+    def last_page_query(self):
+        last = self.num_pages
+        if last <= MAX_OFFSET_PAGE:
+            return f'page={last}'
+        return f'cursor={encode_cursor(last, LAST)}'
@@ -0,0 +1,284 @@
+import math
+import re
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models import Case, Count, F, FloatField, Sum, When
+
+from . import feeds
+from .models import TERM_LENGTH, Post, PostTerm
+
+FTS_TABLE = 'posts_post_search'
+# Больше стольких результатов не ранжируем: дальше первых страниц
+# поиска никто не листает.
+SEARCH_MAX_RESULTS = 1000
+MAX_QUERY_TERMS = 8
+
+WORD_RE = re.compile(r'\w+')
+STOP_WORDS = frozenset((
+    'и', 'в', 'во', 'не', 'что', 'он', 'на', 'я', 'с', 'со', 'как', 'а',
+    'то', 'все', 'она', 'так', 'его', 'но', 'да', 'ты', 'к', 'у', 'же',
+    'вы', 'за', 'бы', 'по', 'ее', 'мне', 'было', 'вот', 'от', 'меня',
+    'о', 'из', 'ему', 'ли', 'если', 'или', 'ни', 'быть', 'был', 'до',
+    'нас', 'для', 'мы', 'их', 'это', 'the', 'a', 'an', 'and', 'or', 'of',
+    'to', 'in', 'is', 'it',
+))
+
+
+def _endings(endings, after_a=()):
+    """
+    Группа окончаний стеммера Snowball: сначала длинные. Окончания
+    after_a отрезаются, только если перед ними стоит а или я.
+    """
+    return (
+        tuple(sorted(endings + after_a, key=len, reverse=True)),
+        frozenset(after_a),
+    )
+
+
+PERFECTIVE_GERUND = _endings(
+    ('ившись', 'ывшись', 'ивши', 'ывши', 'ив', 'ыв'),
+    ('вшись', 'вши', 'в')
+)
+ADJECTIVE = _endings((
+    'ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие', 'ые', 'ое',
+    'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом', 'их', 'ых', 'ую',
+    'юю', 'ая', 'яя', 'ою', 'ею',
+))
+PARTICIPLE = _endings(('ивш', 'ывш', 'ующ'), ('ем', 'нн', 'вш', 'ющ', 'щ'))
+REFLEXIVE = _endings(('ся', 'сь'))
+VERB = _endings(
+    (
+        'ейте', 'уйте', 'ила', 'ыла', 'ена', 'ите', 'или', 'ыли', 'ило',
+        'ыло', 'ено', 'ует', 'уют', 'ены', 'ить', 'ыть', 'ишь', 'ей', 'уй',
+        'ил', 'ыл', 'им', 'ым', 'ен', 'ят', 'ит', 'ыт', 'ую', 'ю',
+    ),
+    (
+        'ете', 'йте', 'ешь', 'нно', 'ла', 'на', 'ли', 'ем', 'ло', 'но',
+        'ет', 'ют', 'ны', 'ть', 'й', 'л', 'н',
+    )
+)
+NOUN = _endings((
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ев', 'ов', 'ие',
+    'ье', 'еи', 'ии', 'ей', 'ой', 'ий', 'ям', 'ем', 'ам', 'ом', 'ах',
+    'ях', 'ию', 'ью', 'ия', 'ья', 'а', 'е', 'и', 'й', 'о', 'у', 'ы', 'ь',
+    'ю', 'я',
+))
+SUPERLATIVE = _endings(('ейше', 'ейш'))
+DERIVATIONAL = _endings(('ость', 'ост'))
+VOWELS = 'аеиоуыэюя'
+CYRILLIC_RE = re.compile('[а-я]')
+
+
+def _remove(word, group):
+    endings, after_a = group
+    for ending in endings:
+        if word.endswith(ending):
+            stem = word[:-len(ending)]
+            if ending in after_a and not stem.endswith(('а', 'я')):
+                return word, False
+            return stem, True
+    return word, False
+
+
+def _regions(word):
+    """Начала областей RV и R2 стеммера Snowball."""
+    rv = r1 = r2 = len(word)
+    for index, char in enumerate(word):
+        if char in VOWELS:
+            rv = index + 1
+            break
+    for index in range(1, len(word)):
+        if word[index - 1] in VOWELS and word[index] not in VOWELS:
+            r1 = index + 1
+            break
+    for index in range(r1 + 1, len(word)):
+        if word[index - 1] in VOWELS and word[index] not in VOWELS:
+            r2 = index + 1
+            break
+    return rv, r2
+
+
+@lru_cache(maxsize=50000)
+def stem(word):
+    """Русский стеммер Snowball; слова без кириллицы не меняются."""
+    if not CYRILLIC_RE.search(word):
+        return word
+    rv, r2 = _regions(word)
+    head, tail = word[:rv], word[rv:]
+    tail, removed = _remove(tail, PERFECTIVE_GERUND)
+    if not removed:
+        tail, _ = _remove(tail, REFLEXIVE)
+        tail, removed = _remove(tail, ADJECTIVE)
+        if removed:
+            tail, _ = _remove(tail, PARTICIPLE)
+        else:
+            tail, removed = _remove(tail, VERB)
+            if not removed:
+                tail, _ = _remove(tail, NOUN)
+    if tail.endswith('и'):
+        tail = tail[:-1]
+    word = head + tail
+    if len(word) > r2:
+        derived, removed = _remove(word[r2:], DERIVATIONAL)
+        word = word[:r2] + derived
+    tail = word[rv:]
+    tail, removed = _remove(tail, SUPERLATIVE)
+    if tail.endswith('нн'):
+        tail = tail[:-1]
+    elif not removed and tail.endswith('ь'):
+        tail = tail[:-1]
+    return head + tail
+
+
+def tokenize(text):
+    """Основы слов текста: нижний регистр, ё -> е, без стоп-слов."""
+    words = WORD_RE.findall(text.lower().replace('ё', 'е'))
+    return [
+        stem(word) for word in words
+        if len(word) > 1 and word not in STOP_WORDS
+    ]
+
+
+@lru_cache(maxsize=None)
+def _fts5_enabled(vendor):
+    # Таблицу FTS5 создаёт миграция, если SQLite собран с FTS5;
+    # иначе поиск идёт по таблице PostTerm.
+    if vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+            [FTS_TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def use_fts5():
+    return _fts5_enabled(connection.vendor)
+
+
+def _weights(terms):
+    frequencies = {}
+    for term in terms:
+        frequencies[term] = frequencies.get(term, 0) + 1
+    return {term: count / len(terms) for term, count in frequencies.items()}
+
+
+def index_posts(posts):
+    """Проиндексировать пачку постов за несколько запросов."""
+    posts = list(posts)
+    ids = [[post.pk] for post in posts]
+    if use_fts5():
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', ids
+            )
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, terms) VALUES (%s, %s)',
+                [[post.pk, ' '.join(tokenize(post.text))] for post in posts]
+            )
+        return
+    PostTerm.objects.filter(post_id__in=[pk for pk, in ids]).delete()
+    PostTerm.objects.bulk_create([
+        PostTerm(post_id=post.pk, term=term[:TERM_LENGTH], weight=weight)
+        for post in posts
+        for term, weight in _weights(tokenize(post.text)).items()
+    ])
+
+
+def index_post(post):
+    index_posts([post])
+
+
+def unindex_post(post_id):
+    if use_fts5():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+            )
+    # Строки PostTerm удаляются каскадом вместе с постом.
+
+
+def unindex_queryset(posts):
+    """
+    Убрать из индекса посты выборки одним запросом: для удаления
+    без сигналов, когда строки PostTerm не удаляются каскадом.
+    """
+    if use_fts5():
+        subquery, params = posts.values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({subquery})',
+                params
+            )
+    PostTerm.objects.filter(post__in=posts).delete()
+
+
+def _query_terms(query):
+    terms = list(dict.fromkeys(tokenize(query)))
+    return terms[:MAX_QUERY_TERMS]
+
+
+def search_ids(query, limit=SEARCH_MAX_RESULTS):
+    """
+    id постов, в которых есть все слова запроса, по убыванию
+    релевантности: bm25 в FTS5, иначе tf-idf по PostTerm.
+    """
+    terms = _query_terms(query)
+    if not terms:
+        return []
+    if use_fts5():
+        match = ' '.join(f'"{term}"' for term in terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}), rowid DESC LIMIT %s',
+                [match, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+    postings = PostTerm.objects.filter(term__in=terms)
+    total = feeds.get_total(feeds.ALL_POSTS, Post.objects.all()) or 1
+    idf = {
+        term: math.log(1 + total / frequency)
+        for term, frequency in postings.values_list('term').annotate(
+            frequency=Count('pk')
+        ).order_by()
+    }
+    if len(idf) < len(terms):
+        return []
+    return list(
+        postings.values('post_id').annotate(
+            matched=Count('pk'),
+            score=Sum(Case(
+                *(When(term=term, then=F('weight') * weight)
+                  for term, weight in idf.items()),
+                output_field=FloatField()
+            ))
+        ).filter(matched=len(terms)).order_by(
+            '-score', '-post_id'
+        ).values_list('post_id', flat=True)[:limit]
+    )
+
+
+def rebuild_index(batch_size=1000):
+    if use_fts5():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    else:
+        PostTerm.objects.all().delete()
+    return index_queryset(Post.objects.all(), batch_size)
+
+
+def index_queryset(posts, batch_size=1000):
+    """Проиндексировать посты из выборки пачками; возвращает их число."""
+    indexed = 0
+    batch = []
+    for post in posts.only('pk', 'text').iterator(chunk_size=batch_size):
+        batch.append(post)
+        if len(batch) == batch_size:
+            index_posts(batch)
+            indexed += len(batch)
+            batch = []
+    index_posts(batch)
+    return indexed + len(batch)
@@ -0,0 +1,157 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import blobs, cards, counters, feeds, search, timeline
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+# Поля автора, которые выводятся в карточке поста.
+CARD_AUTHOR_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_state(sender, instance, **kwargs):
+    instance._old_group_id, instance._old_image = None, ''
+    if instance.pk:
+        instance._old_group_id, instance._old_image = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'image')
+            .first()
+        ) or (None, '')
+
+
+def follower_feeds(post, readers):
+    """
+    Ленты подписок, в которых виден пост: разложенные fan_out
+    (readers) или, у популярного автора, ленты всех подписчиков.
+    """
+    if post.author_id in timeline.pull_author_ids():
+        readers = timeline.follower_ids(post.author_id)
+    return [feeds.follow_feed(user_id) for user_id in readers]
+
+
+def bump_post_feeds(post, readers=None, extra=()):
+    if readers is None:
+        readers = []
+        if post.author_id not in timeline.pull_author_ids():
+            readers = timeline.follower_ids(post.author_id)
+    feeds.bump([
+        *feeds.post_feeds(post),
+        *extra,
+        *(feeds.follow_feed(user_id) for user_id in readers),
+    ])
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    search.index_post(instance)
+    old_image = getattr(instance, '_old_image', '')
+    if instance.image.name != old_image:
+        blobs.acquire(instance.image.name)
+        blobs.release(old_image)
+    if created:
+        counters.adjust_user(instance.author_id, 'posts_count', 1)
+        readers = timeline.fan_out(instance)
+        feeds.adjust_totals(
+            [*feeds.post_feeds(instance), *follower_feeds(instance, readers)],
+            1
+        )
+        bump_post_feeds(instance, readers=readers)
+        return
+    old_group_id = getattr(instance, '_old_group_id', None)
+    extra = []
+    if old_group_id != instance.group_id:
+        if old_group_id:
+            feeds.adjust_totals([feeds.group_feed(old_group_id)], -1)
+            extra.append(feeds.group_feed(old_group_id))
+        if instance.group_id:
+            feeds.adjust_totals([feeds.group_feed(instance.group_id)], 1)
+    bump_post_feeds(instance, extra=extra)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.adjust_user(instance.author_id, 'posts_count', -1)
+    feeds.adjust_totals(feeds.post_feeds(instance), -1)
+    # Пост мог уже уйти из подрезанных лент: счётчики лент подписок
+    # сбрасываются, а не уменьшаются.
+    readers = list(timeline.follower_ids(instance.author_id))
+    feeds.reset_totals(
+        [feeds.follow_feed(user_id) for user_id in readers]
+    )
+    if instance.author_id in timeline.pull_author_ids():
+        readers = []
+    bump_post_feeds(instance, readers=readers)
+    cards.delete_cards(instance)
+    search.unindex_post(instance.pk)
+    blobs.release(instance.image.name)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    if not created:
+        instance.posts.update(updated=timezone.now())
+        feeds.bump([feeds.SITE])
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    instance.posts.update(updated=timezone.now())
+    feeds.bump([feeds.SITE])
+
+
+@receiver(post_save, sender=User)
+def author_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        return
+    if update_fields is None or CARD_AUTHOR_FIELDS & set(update_fields):
+        instance.posts.update(updated=timezone.now())
+        feeds.bump([feeds.SITE])
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust_comments(instance.post_id, 1)
+        feeds.bump([feeds.post_page(instance.post_id)])
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.adjust_comments(instance.post_id, -1)
+    feeds.bump([feeds.post_page(instance.post_id)])
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust_user(instance.author_id, 'followers_count', 1)
+        counters.adjust_user(instance.user_id, 'following_count', 1)
+        timeline.backfill(instance)
+    feeds.reset_totals([feeds.follow_feed(instance.user_id)])
+    feeds.bump([
+        feeds.follow_feed(instance.user_id),
+        feeds.profile_page(instance.user_id),
+        feeds.profile_page(instance.author_id),
+    ])
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.adjust_user(instance.author_id, 'followers_count', -1)
+    counters.adjust_user(instance.user_id, 'following_count', -1)
+    timeline.drop(instance)
+    timeline.demote(instance.author_id)
+    feeds.reset_totals([feeds.follow_feed(instance.user_id)])
+    feeds.bump([
+        feeds.follow_feed(instance.user_id),
+        feeds.profile_page(instance.user_id),
+        feeds.profile_page(instance.author_id),
+    ])
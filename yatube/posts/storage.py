@@ -0,0 +1,58 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def content_hash(content):
+    """
+    sha256 файла. ImageUploadHandler считает его во время загрузки,
+    тогда файл второй раз не читается.
+    """
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+    sha256 = hashlib.sha256()
+    for chunk in content.chunks():
+        sha256.update(chunk)
+    content.seek(0)
+    return sha256.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файлы хранятся под именем sha256 их содержимого:
+    posts/ab/abcdef....jpg. Повторная загрузка той же картинки
+    не пишет файл заново, а возвращает уже сохранённое имя.
+    Сколько постов ссылается на файл, считает posts.blobs.
+    """
+
+    def blob_name(self, name, content):
+        digest = content_hash(content)
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, digest[:2], f'{digest}{extension}')
+
+    def is_blob(self, name):
+        directory, filename = os.path.split(name)
+        digest = os.path.splitext(filename)[0]
+        return (
+            len(digest) == 64
+            and os.path.basename(directory) == digest[:2]
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.blob_name(name, content)
+        if self.exists(name):
+            # Свежее время изменения не даёт сборщику мусора удалить
+            # файл, пока пост с ним ещё сохраняется.
+            os.utime(self.path(name))
+            return name
+        return self._save(name, content)
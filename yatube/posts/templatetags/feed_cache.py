@@ -0,0 +1,67 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from core.replicas import replica_reads, sees_own_writes
+from core.stampede import cached, remember
+
+register = template.Library()
+
+
+class FeedCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, name, version, vary_on):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.name = name
+        self.version = version
+        self.vary_on = vary_on
+
+    def render(self, context):
+        timeout = self.timeout.resolve(context)
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        version = self.version.resolve(context)
+        key = make_template_fragment_key(self.name, [version, *vary_on])
+        if replica_reads():
+            # Посты страницы прочитаны из реплики и могут отставать от
+            # поколения version: готовый фрагмент берём, свой не кладём.
+            fragment = cached(key)
+            if fragment is None:
+                fragment = self.nodelist.render(context)
+            return fragment
+        request = context.get('request')
+        return remember(
+            key,
+            lambda: self.nodelist.render(context),
+            timeout,
+            stale_key='stale:' + make_template_fragment_key(
+                self.name, vary_on
+            ),
+            stale_ok=request is None or not sees_own_writes(request)
+        )
+
+
+@register.tag
+def feedcache(parser, token):
+    """
+    {% feedcache timeout name version [vary_on ...] %} ...
+    {% endfeedcache %}
+
+    Как {% cache %}, но фрагмент пересчитывает один запрос
+    (core.stampede.remember): остальные, пока он считает, получают
+    фрагмент прошлого поколения ленты version. Запрос после записи
+    (core.replicas.sees_own_writes) прошлое поколение не получает,
+    а запрос, читающий из реплики, фрагмент в кеш не кладёт.
+    """
+    nodelist = parser.parse(('endfeedcache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 4:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} принимает не меньше трёх аргументов.'
+        )
+    return FeedCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        bits[2],
+        parser.compile_filter(bits[3]),
+        [parser.compile_filter(bit) for bit in bits[4:]]
+    )
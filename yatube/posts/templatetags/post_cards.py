@@ -0,0 +1,17 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts.cards import get_card
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_card(post, page, all_author_posts_link=False,
+              all_group_posts_link=False):
+    return mark_safe(get_card(
+        post,
+        page,
+        all_author_posts_link,
+        all_group_posts_link
+    ))
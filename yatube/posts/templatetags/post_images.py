@@ -0,0 +1,29 @@
+from django import template
+
+from posts import thumbnails, variants
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post):
+    """
+    Готовая миниатюра картинки поста. Обычно она уже подтянута пакетом
+    для всей страницы (thumbnails.prefetch); иначе только поиск
+    в KV-хранилище sorl: миниатюры создаются в фоне после загрузки.
+    """
+    try:
+        return post.thumbnail
+    except AttributeError:
+        return thumbnails.lookup(post.image.name)
+
+
+@register.simple_tag
+def post_image_sources(post):
+    """[(mime-тип, srcset)] вариантов картинки поста для <picture>."""
+    try:
+        return post.image_sources
+    except AttributeError:
+        return variants.sources_for([post.image.name]).get(
+            post.image.name, []
+        )
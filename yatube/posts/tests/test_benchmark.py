@@ -0,0 +1,135 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models.signals import post_delete
+from django.test import TestCase, override_settings
+
+from .. import benchmark, search
+from ..models import Comment, Follow, Post, TimelineEntry
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        benchmark.seed(
+            users=30,
+            posts=200,
+            follows=5,
+            comments=100,
+            image_share=0.1,
+            log=lambda message: None
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_seed_builds_consistent_dataset(self):
+        """
+        Проверяем, что посты, подписки и ленты подписок созданы,
+        а популярные авторы пишут больше остальных.
+        """
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        follow = Follow.objects.select_related('author__counters').first()
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user_id=follow.user_id,
+                post__author_id=follow.author_id
+            ).count(),
+            follow.author.counters.posts_count
+        )
+        top, *_, last = benchmark.Targets(benchmark.random.Random(1)).authors
+        self.assertGreater(
+            Post.objects.filter(author__username=top).count(),
+            Post.objects.filter(author__username=last).count()
+        )
+
+    def test_run_reports_latency_and_regressions(self):
+        """
+        Проверяем метрики прогона и поиск регрессий по сохранённому
+        прогону.
+        """
+        results = benchmark.run(requests=4, warmup=1)
+        self.assertEqual(list(results), list(benchmark.SCENARIOS))
+        for scenario, metrics in results.items():
+            with self.subTest(scenario=scenario):
+                self.assertEqual(metrics['requests'], 4)
+                self.assertEqual(metrics['errors'], 0)
+                self.assertLessEqual(metrics['p50'], metrics['p99'])
+                self.assertGreater(metrics['queries'], 0)
+        baseline = {
+            scenario: dict(metrics, p95=metrics['p95'] * 2)
+            for scenario, metrics in results.items()
+        }
+        baseline['index']['p99'] = results['index']['p99'] / 2
+        regressions = [
+            (scenario, metric)
+            for scenario, metric, *_, regressed
+            in benchmark.compare(results, baseline) if regressed
+        ]
+        self.assertEqual(regressions, [('index', 'p99')])
+
+    def test_contention_reports_throughput(self):
+        """Проверяем метрики одновременных чтений и записей."""
+        metrics = benchmark.contention(
+            benchmark.ROLLBACK_PRAGMAS, readers=1, writers=1, duration=0.2
+        )
+        self.assertEqual(set(metrics), {
+            'reads', 'writes', 'read_p95', 'write_p95', 'errors'
+        })
+        # Тестовая база в памяти общая для потоков, а основной поток
+        # держит транзакцию: часть операций может упасть на блокировке.
+        self.assertGreater(metrics['reads'] + metrics['errors'], 0)
+
+    def test_seed_refuses_existing_data(self):
+        """
+        Проверяем, что повторное заполнение без --flush завершается
+        понятной ошибкой, а не IntegrityError.
+        """
+        with self.assertRaisesMessage(CommandError, '--flush'):
+            call_command(
+                'seed_benchmark', users=5, posts=10, stdout=StringIO()
+            )
+        self.assertEqual(Post.objects.count(), 200)
+
+    def test_flush_deletes_without_per_row_signals(self):
+        """
+        Проверяем, что flush удаляет данные заполнения без сигналов
+        на каждую строку и пересчитывает счётчики оставшихся.
+        """
+        reader = get_user_model().objects.create_user(username='reader')
+        post = Post.objects.create(author=reader, text='Кот остаётся')
+        author = get_user_model().objects.filter(
+            username__startswith=benchmark.BENCH_PREFIX
+        ).first()
+        Follow.objects.create(user=author, author=reader)
+        Comment.objects.create(post=post, author=author, text='Мяу')
+        deleted_rows = []
+
+        def count(sender, **kwargs):
+            deleted_rows.append(sender)
+
+        post_delete.connect(count)
+        try:
+            self.assertGreater(benchmark.flush(), 0)
+        finally:
+            post_delete.disconnect(count)
+        self.assertEqual(deleted_rows, [])
+        self.assertEqual(list(Post.objects.all()), [post])
+        self.assertFalse(Follow.objects.exists())
+        self.assertFalse(TimelineEntry.objects.exists())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(reader.counters.followers_count, 0)
+        self.assertEqual(search.search_ids('кот'), [post.pk])
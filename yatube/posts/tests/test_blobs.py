@@ -0,0 +1,97 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from .. import blobs
+from ..models import ImageBlob, Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+OTHER_GIF = SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\x00\xFF\x00')
+
+User = get_user_model()
+
+
+def gif(content=SMALL_GIF, name='small.gif'):
+    return SimpleUploadedFile(name, content, 'image/gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageBlobTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def references(self, name):
+        return ImageBlob.objects.get(name=name).references
+
+    def test_same_picture_is_stored_once(self):
+        """
+        Проверяем, что одинаковые картинки хранятся одним файлом,
+        а ссылки на него считаются.
+        """
+        first = Post.objects.create(
+            text='Первый', author=self.user, image=gif()
+        )
+        second = Post.objects.create(
+            text='Второй', author=self.user, image=gif(name='copy.gif')
+        )
+        self.assertEqual(first.image.name, second.image.name)
+        storage = blobs.image_storage()
+        directory = first.image.name.rsplit('/', 1)[0]
+        self.assertEqual(len(storage.listdir(directory)[1]), 1)
+        self.assertEqual(self.references(first.image.name), 2)
+
+    def test_unreferenced_files_are_collected(self):
+        """
+        Проверяем, что после замены картинки и удаления поста сборщик
+        удаляет файлы без ссылок и не трогает используемые.
+        """
+        storage = blobs.image_storage()
+        kept = Post.objects.create(text='Живой', author=self.user, image=gif())
+        post = Post.objects.create(
+            text='Временный', author=self.user, image=gif()
+        )
+        post.image = gif(OTHER_GIF, 'other.gif')
+        post.save()
+        replacement = post.image.name
+        self.assertEqual(self.references(kept.image.name), 1)
+        post.delete()
+        self.assertEqual(self.references(replacement), 0)
+        untracked = storage.save('posts/dummy.gif', ContentFile(b'orphan'))
+        self.assertTrue(storage.is_blob(untracked))
+
+        out = StringIO()
+        call_command('collect_images', '--grace=0', stdout=out)
+        self.assertIn('Удалено файлов: 2', out.getvalue())
+        self.assertTrue(storage.exists(kept.image.name))
+        self.assertFalse(storage.exists(replacement))
+        self.assertFalse(storage.exists(untracked))
+        self.assertFalse(ImageBlob.objects.filter(name=replacement).exists())
+        self.assertEqual(
+            blobs.collect(timedelta(0)),
+            [],
+            'Повторная сборка не должна ничего удалять.'
+        )
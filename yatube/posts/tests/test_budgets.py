@@ -0,0 +1,129 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.testing import QueryBudgetTestMixin
+from ..models import Comment, Follow, Group, Post
+from ..urls import urlpatterns
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+NUM_OF_POSTS = 300
+NUM_OF_COMMENTS = 300
+NUM_OF_FOLLOWERS = 150
+
+User = get_user_model()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_QUEUE_MODE='sync')
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы'
+        )
+        followers = [
+            User.objects.create(username=f'follower_{i}')
+            for i in range(NUM_OF_FOLLOWERS)
+        ]
+        for follower in followers:
+            Follow.objects.create(user=follower, author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(NUM_OF_POSTS):
+            cls.post = Post.objects.create(
+                text=f'Тестовый пост номер {i}',
+                author=cls.author,
+                group=cls.group
+            )
+        Comment.objects.bulk_create(
+            Comment(
+                post=cls.post,
+                author=followers[i % len(followers)],
+                text=f'Комментарий {i}'
+            )
+            for i in range(NUM_OF_COMMENTS)
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_every_view_declares_budget(self):
+        """Проверяем, что у каждого view приложения posts есть бюджет."""
+        for pattern in urlpatterns:
+            with self.subTest(view=pattern.name):
+                self.assertTrue(hasattr(pattern.callback, 'query_budget'))
+
+    def test_read_views_stay_within_budget(self):
+        """
+        Проверяем страницы на сотнях постов, комментариев и подписок
+        с холодным и прогретым кешем.
+        """
+        pages = [
+            (self.guest_client, reverse('posts:index')),
+            (self.guest_client, reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug})),
+            (self.guest_client, reverse(
+                'posts:profile', kwargs={'username': self.author.username})),
+            (self.guest_client, reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.pk})),
+            (self.guest_client, reverse(
+                'posts:post_comments', kwargs={'post_id': self.post.pk})),
+            (self.guest_client, reverse('posts:post_search') + '?q=пост'),
+            (self.reader_client, reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.pk})),
+            (self.reader_client, reverse('posts:follow_index')),
+            (self.reader_client, reverse('posts:index') + '?page=20'),
+            (self.author_client, reverse('posts:post_create')),
+            (self.author_client, reverse(
+                'posts:post_edit', kwargs={'post_id': self.post.pk})),
+        ]
+        for client, url in pages + pages:
+            with self.subTest(url=url):
+                self.request_within_budget(client, 'get', url)
+
+    def test_write_views_stay_within_budget(self):
+        """Проверяем создание поста, комментарий и подписки."""
+        requests = [
+            ('post', reverse('posts:post_create'), {'text': 'Новый пост'}),
+            ('post', reverse(
+                'posts:add_comment', kwargs={'post_id': self.post.pk}
+            ), {'text': 'Новый комментарий'}),
+            ('get', reverse(
+                'posts:profile_unfollow',
+                kwargs={'username': self.author.username}
+            ), None),
+            ('get', reverse(
+                'posts:profile_follow',
+                kwargs={'username': self.author.username}
+            ), None),
+        ]
+        for method, url, data in requests:
+            with self.subTest(url=url):
+                self.request_within_budget(
+                    self.reader_client, method, url, data
+                )
+        post = Post.objects.create(text='Пост на удаление', author=self.author)
+        self.request_within_budget(
+            self.author_client,
+            'get',
+            reverse('posts:post_delete', kwargs={'post_id': post.pk})
+        )
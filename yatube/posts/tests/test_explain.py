@@ -0,0 +1,38 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import explain
+
+
+class ExplainTests(TestCase):
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент и страниц постов идут по индексам."""
+        out = StringIO()
+        call_command('explain_queries', stdout=out)
+        self.assertIn('Все запросы идут по индексам', out.getvalue())
+
+    def test_problems_sqlite(self):
+        """В плане SQLite находятся полный скан и сортировка."""
+        plan = (
+            'SCAN posts_post\n'
+            'SCAN posts_post USING INDEX post_date_idx\n'
+            'SEARCH posts_follow USING COVERING INDEX follow_author_user_idx\n'
+            'USE TEMP B-TREE FOR ORDER BY'
+        )
+        self.assertEqual(explain.problems(plan, 'sqlite'), [
+            ('полный скан', 'posts_post'),
+            ('сортировка', 'ORDER BY'),
+        ])
+
+    def test_problems_postgresql(self):
+        """В плане PostgreSQL находится Seq Scan."""
+        plan = (
+            'Limit\n'
+            '  ->  Index Scan using post_date_idx on posts_post\n'
+            '  ->  Seq Scan on posts_comment'
+        )
+        self.assertEqual(explain.problems(plan, 'postgresql'), [
+            ('полный скан', 'posts_comment'),
+        ])
@@ -0,0 +1,113 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Group, Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+NUM_OF_TEST_POSTS = 5
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+User = get_user_model()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост номер {i}, с "кавычками"',
+                author=cls.author,
+                group=cls.group if i % 2 else None
+            )
+            for i in range(NUM_OF_TEST_POSTS)
+        ]
+        cls.posts[0].image = SimpleUploadedFile(
+            'small.gif', SMALL_GIF, content_type='image/gif'
+        )
+        cls.posts[0].save()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_profile_export_streams_jsonl(self):
+        """
+        Проверяем потоковую выгрузку постов автора в JSONL
+        со ссылками на картинки.
+        """
+        response = Client().get(reverse(
+            'posts:profile_export', kwargs={'username': 'author'}
+        ))
+        self.assertTrue(response.streaming)
+        self.assertIn('profile-author.jsonl', response['Content-Disposition'])
+        rows = [
+            json.loads(line) for line in
+            b''.join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual(
+            [row['id'] for row in rows], [post.pk for post in self.posts]
+        )
+        self.assertEqual(rows[1]['group'], self.group.slug)
+        self.assertEqual(
+            rows[0]['image_url'],
+            'http://testserver' + self.posts[0].image.url
+        )
+
+    def test_group_export_csv_gzip(self):
+        """Проверяем выгрузку группы в CSV со сжатием gzip."""
+        response = Client().get(
+            reverse('posts:group_export', kwargs={'slug': self.group.slug}),
+            {'format': 'csv', 'gzip': '1'}
+        )
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        content = gzip.decompress(b''.join(response.streaming_content))
+        rows = list(csv.DictReader(StringIO(content.decode())))
+        self.assertEqual(
+            [row['text'] for row in rows],
+            [post.text for post in self.posts if post.group]
+        )
+
+    def test_export_command_output_can_be_imported(self):
+        """
+        Проверяем, что выгрузку команды export_posts принимает
+        import_data.
+        """
+        path = os.path.join(TEMP_MEDIA_ROOT, 'export.jsonl.gz')
+        call_command(
+            'export_posts', author='author', gzip=True, output=path,
+            stdout=StringIO()
+        )
+        Post.objects.all().delete()
+        call_command('import_data', posts=path, stdout=StringIO())
+        self.assertEqual(
+            list(Post.objects.order_by('pk').values_list('text', 'group')),
+            [(post.text, post.group_id) for post in self.posts]
+        )
@@ -1,5 +1,8 @@
+import hashlib
 import shutil
+import struct
 import tempfile
+import zlib
 from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
@@ -15,6 +18,34 @@ TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 User = get_user_model()
 
 
+def blob_name(content, extension):
+    """Имя файла в хранилище по хешу содержимого."""
+    digest = hashlib.sha256(content).hexdigest()
+    return f'posts/{digest[:2]}/{digest}.{extension}'
+
+
+def png_chunk(kind, data):
+    return (
+        struct.pack('>I', len(data)) + kind + data
+        + struct.pack('>I', zlib.crc32(kind + data))
+    )
+
+
+def png(width, height, padding=0):
+    """
+    Серая картинка PNG с одной строкой пикселей: проверке нужен только
+    заголовок. padding байт комментария увеличивают файл.
+    """
+    header = struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + png_chunk(b'IHDR', header)
+        + png_chunk(b'tEXt', b'Comment\x00' + b'x' * padding)
+        + png_chunk(b'IDAT', zlib.compress(bytes(width + 1)))
+        + png_chunk(b'IEND', b'')
+    )
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostsFormsTests(TestCase):
     @classmethod
@@ -98,7 +129,7 @@ class PostsFormsTests(TestCase):
             Post.objects.filter(
                 text=form_data['text'],
                 group=form_data['group'],
-                image='posts/small.gif',
+                image=blob_name(small_gif, 'gif'),
                 author=self.user,
             )
             .exists()
@@ -192,6 +223,67 @@ class PostsFormsTests(TestCase):
         )
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client(enforce_csrf_checks=True)
+        self.client.force_login(self.user)
+
+    def upload(self, content, name='image.png'):
+        url = reverse('posts:post_create')
+        self.client.get(url)
+        return self.client.post(url, data={
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(name, content, 'image/png'),
+            'csrfmiddlewaretoken': self.client.cookies['csrftoken'].value,
+        })
+
+    def test_upload_is_checked_by_header(self):
+        """
+        Проверяем, что слишком большие файлы и картинки отклоняются
+        с ошибкой формы до декодирования.
+        """
+        cases = {
+            'size': (png(1, 1, padding=2048), 'Файл больше'),
+            'side': (png(12000, 10), 'Слишком большое разрешение'),
+            'pixels': (png(9000, 9000), 'Слишком большое разрешение'),
+            'not image': (b'not an image', 'Загрузите правильное'),
+        }
+        for case, (content, error) in cases.items():
+            with self.subTest(case=case):
+                with self.settings(IMAGE_UPLOAD_MAX_SIZE=1024):
+                    response = self.upload(content)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertIn(
+                    error,
+                    response.context['form'].errors['image'][0]
+                )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=100)
+    def test_large_upload_is_spooled_to_disk(self):
+        """Проверяем, что файл больше порога памяти принимается с диска."""
+        content = png(10, 10, padding=300)
+        response = self.upload(content)
+        self.assertRedirects(
+            response,
+            reverse('posts:profile', kwargs={'username': 'uploader'})
+        )
+        self.assertTrue(
+            Post.objects.filter(image=blob_name(content, 'png')).exists()
+        )
+
+
 class CommentFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
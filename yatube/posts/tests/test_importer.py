@@ -0,0 +1,151 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+
+from .. import importer, search
+from ..models import Comment, Follow, Group, Post, TimelineEntry
+
+TEMP_DATA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+User = get_user_model()
+
+
+def write_jsonl(name, rows):
+    path = os.path.join(TEMP_DATA_ROOT, name)
+    with gzip.open(path, 'wt', encoding='utf-8') as file_:
+        for row in rows:
+            file_.write(row if isinstance(row, str) else json.dumps(row))
+            file_.write('\n')
+    return path
+
+
+def write_csv(name, rows):
+    path = os.path.join(TEMP_DATA_ROOT, name)
+    with open(path, 'w', encoding='utf-8', newline='') as file_:
+        writer = csv.DictWriter(file_, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+class ImportDataTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.files = {
+            'users': write_csv('users.csv', [
+                {'username': 'author', 'first_name': 'Лев'},
+                {'username': 'reader', 'first_name': ''},
+                {'username': 'bad name!', 'first_name': ''},
+            ]),
+            'groups': write_jsonl('groups.jsonl.gz', [
+                {'slug': 'cats', 'title': 'Коты'},
+            ]),
+            'posts': write_jsonl('posts.jsonl.gz', [
+                {'id': 10, 'text': 'Коты спят на подоконниках',
+                 'author': 'author', 'group': 'cats',
+                 'pub_date': '2021-05-01T10:00:00'},
+                {'id': 11, 'text': 'Второй пост', 'author': 'author'},
+                {'id': 12, 'text': 'Пост без автора', 'author': 'nobody'},
+                '{broken',
+            ]),
+            'comments': write_csv('comments.csv', [
+                {'post': '10', 'author': 'reader', 'text': 'Мяу'},
+                {'post': '99', 'author': 'reader', 'text': 'Нет поста'},
+            ]),
+            'follows': write_jsonl('follows.jsonl.gz', [
+                {'user': 'reader', 'author': 'author'},
+                {'user': 'reader', 'author': 'author'},
+                {'user': 'author', 'author': 'author'},
+            ]),
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DATA_ROOT, ignore_errors=True)
+
+    def import_data(self, **options):
+        options.update({kind: path for kind, path in self.files.items()})
+        call_command(
+            'import_data', stdout=StringIO(), stderr=StringIO(), **options
+        )
+
+    def test_import_loads_rows_and_derived_data(self):
+        """
+        Проверяем загрузку JSONL и CSV, пропуск строк с ошибками
+        и пересчёт счётчиков, лент подписок и поиска.
+        """
+        self.import_data()
+        author = User.objects.get(username='author')
+        reader = User.objects.get(username='reader')
+        self.assertFalse(User.objects.filter(username='bad name!').exists())
+        self.assertEqual(
+            sorted(Post.objects.values_list('pk', flat=True)), [10, 11]
+        )
+        post = Post.objects.get(pk=10)
+        self.assertEqual(post.group, Group.objects.get(slug='cats'))
+        self.assertEqual(post.pub_date.year, 2021)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(Comment.objects.get().author, reader)
+        self.assertEqual(Follow.objects.get().author, author)
+        self.assertEqual(author.counters.posts_count, 2)
+        self.assertEqual(author.counters.followers_count, 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=reader).count(), 2
+        )
+        self.assertEqual(search.search_ids('кот'), [10])
+
+    def test_defer_recreates_indexes(self):
+        """Проверяем, что с --defer индексы создаются заново."""
+        def indexes():
+            with connection.cursor() as cursor:
+                return set(connection.introspection.get_constraints(
+                    cursor, Post._meta.db_table
+                ))
+        before = indexes()
+        self.import_data(defer=True)
+        self.assertEqual(indexes(), before)
+        self.assertEqual(Post.objects.count(), 2)
+
+    def test_too_many_errors_abort_import(self):
+        """Проверяем, что загрузка прерывается после --max-errors ошибок."""
+        with self.assertRaises(CommandError):
+            self.import_data(max_errors=1)
+
+    def test_repeated_import_counts_only_new_rows(self):
+        """Проверяем, что пропущенные дубликаты не считаются загруженными."""
+        kinds = ('users', 'groups', 'posts', 'follows')
+        paths = {kind: self.files[kind] for kind in kinds}
+        first = importer.import_files(paths, log=lambda message: None)
+        self.assertEqual(
+            first.loaded,
+            {'users': 2, 'groups': 1, 'posts': 2, 'follows': 1}
+        )
+        second = importer.import_files(paths, log=lambda message: None)
+        self.assertEqual(sum(second.loaded.values()), 0)
+
+    def test_import_recounts_only_touched_data(self):
+        """
+        Проверяем, что без --rebuild счётчики чужих постов не
+        пересчитываются, а с ним -- пересчитываются.
+        """
+        other = User.objects.create_user(username='other')
+        post = Post.objects.create(author=other, text='Чужой пост')
+        Post.objects.filter(pk=post.pk).update(comments_count=5)
+        self.import_data()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 5)
+        self.import_data(rebuild=True)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
@@ -1,7 +1,10 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post, Comment
+from ..models import Group, Post, Comment, Follow, UserCounters
 
 SYMBOLS_NUM = 15
 
@@ -111,3 +114,55 @@ class CommentModelTest(TestCase):
         comment = CommentModelTest.comment
         help_text = comment._meta.get_field('text').help_text
         self.assertEqual(help_text, 'Прокомментируйте пост')
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+
+    def test_counters_follow_changes(self):
+        """Проверяем, что счётчики обновляются при изменениях данных."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Post.objects.create(author=self.author, text='Второй пост')
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        comment = Comment.objects.create(
+            post=post,
+            author=self.user,
+            text='Комментарий'
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        author_counters = UserCounters.objects.get(user=self.author)
+        self.assertEqual(author_counters.posts_count, 2)
+        self.assertEqual(author_counters.followers_count, 1)
+        self.assertEqual(
+            UserCounters.objects.get(user=self.user).following_count,
+            1
+        )
+        comment.delete()
+        follow.delete()
+        post.delete()
+        author_counters.refresh_from_db()
+        self.assertEqual(author_counters.posts_count, 1)
+        self.assertEqual(author_counters.followers_count, 0)
+
+    def test_recount_command_repairs_drift(self):
+        """Проверяем, что команда recount_counters исправляет счётчики."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.user, text='Текст')
+        UserCounters.objects.update(posts_count=100)
+        Post.objects.update(comments_count=0)
+        call_command('recount_counters', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(
+            UserCounters.objects.get(user=self.author).posts_count,
+            1
+        )
+        self.assertEqual(
+            UserCounters.objects.get(user=self.user).posts_count,
+            0
+        )
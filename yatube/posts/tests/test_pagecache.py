@@ -0,0 +1,183 @@
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.replicas import STICKY_COOKIE
+from core.stampede import remember
+
+from .. import feeds
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            group=cls.group,
+            text='Тестовый пост',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_repeat_visit_is_served_from_cache(self):
+        """Проверяем, что повторная страница не обращается к базе."""
+        url = reverse('posts:index')
+        first = self.guest_client.get(url)
+        self.assertFalse(first.wsgi_request.page_cache_hit)
+        with self.assertNumQueries(0):
+            second = self.guest_client.get(url)
+        self.assertTrue(second.wsgi_request.page_cache_hit)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_conditional_get_returns_not_modified(self):
+        """
+        Проверяем 304 по If-None-Match и If-Modified-Since и 200 после
+        подписки, удаления комментария и удаления поста.
+        """
+        comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        other = Post.objects.create(author=self.reader, text='Другой пост')
+        pages = {
+            reverse('posts:profile', kwargs={
+                'username': self.author.username
+            }): lambda: Follow.objects.create(
+                user=self.reader, author=self.author
+            ),
+            reverse('posts:post_detail', kwargs={
+                'post_id': self.post.pk
+            }): comment.delete,
+            reverse('posts:index'): other.delete,
+        }
+        # Время смены поколений лент управляется вручную: Last-Modified
+        # отдаётся только после секунды, в которую сменилось поколение.
+        clock = SimpleNamespace(now=time.time())
+        fake_time = SimpleNamespace(time=lambda: clock.now)
+        with mock.patch.object(feeds, 'time', fake_time):
+            for url, change in pages.items():
+                with self.subTest(url=url):
+                    cache.clear()
+                    self.guest_client.get(url)
+                    clock.now += 5
+                    response = self.guest_client.get(url)
+                    self.assertEqual(self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    ).status_code, 304)
+                    self.assertEqual(self.guest_client.get(
+                        url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                    ).status_code, 304)
+                    change()
+                    clock.now += 5
+                    self.assertEqual(self.guest_client.get(
+                        url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                    ).status_code, 200)
+
+    def test_changes_invalidate_pages(self):
+        """Проверяем, что пост, комментарий и подписка обновляют страницы."""
+        pages = {
+            reverse('posts:index'): lambda: Post.objects.create(
+                author=self.author, text='Новый пост'
+            ),
+            reverse('posts:group_list', kwargs={
+                'slug': self.group.slug
+            }): lambda: Post.objects.create(
+                author=self.reader, group=self.group, text='Пост в группе'
+            ),
+            reverse('posts:post_detail', kwargs={
+                'post_id': self.post.pk
+            }): lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий'
+            ),
+            reverse('posts:profile', kwargs={
+                'username': self.author.username
+            }): lambda: Follow.objects.create(
+                user=self.reader, author=self.author
+            ),
+        }
+        for url, change in pages.items():
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                change()
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.wsgi_request.page_cache_hit)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_logged_in_users_bypass_cache(self):
+        """Проверяем, что вошедшим страница не отдаётся из кеша."""
+        client = Client()
+        client.force_login(self.reader)
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        response = client.get(url)
+        self.assertFalse(response.wsgi_request.page_cache_hit)
+        self.assertNotIn('ETag', response)
+        self.assertIsNotNone(response.context)
+
+    def test_writer_does_not_get_stale_fragment(self):
+        """
+        Проверяем, что пока ленту пересчитывает другой запрос, читатель
+        получает прошлое поколение, а только что писавший -- свежее.
+        """
+        client = Client()
+        client.force_login(self.author)
+        url = reverse('posts:index')
+        client.get(url)
+        Post.objects.create(author=self.author, text='Свежий пост')
+        add = cache.add
+
+        def locked(key, *args, **kwargs):
+            # Блокировки пересчёта держит другой запрос.
+            return not key.startswith('lock:') and add(key, *args, **kwargs)
+
+        with mock.patch.object(cache, 'add', locked):
+            stale = client.get(url)
+            client.cookies[STICKY_COOKIE] = '1'
+            fresh = client.get(url)
+        self.assertNotContains(stale, 'Свежий пост')
+        self.assertContains(fresh, 'Свежий пост')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_author_sees_own_post_without_replicas(self):
+        """
+        Проверяем, что и без реплик после публикации поста фрагмент
+        ленты не берётся из прошлого поколения.
+        """
+        client = Client()
+        client.force_login(self.author)
+        stale_ok = []
+
+        def spy(*args, **kwargs):
+            # Запоминаем аргумент в момент вызова внутри запроса.
+            stale_ok.append(kwargs['stale_ok'])
+            return remember(*args, **kwargs)
+
+        response = client.post(
+            reverse('posts:post_create'), {'text': 'Свежий пост'}
+        )
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        with mock.patch('posts.templatetags.feed_cache.remember', spy):
+            response = client.get(response['Location'])
+        self.assertEqual(stale_ok, [False])
+        self.assertContains(response, 'Свежий пост')
@@ -0,0 +1,83 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from .. import search
+from ..models import Post, PostTerm
+
+POST_SEARCH = 'posts:post_search'
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.cats = Post.objects.create(
+            text='Наши коты любят спать на подоконнике',
+            author=cls.user,
+        )
+        cls.dogs = Post.objects.create(
+            text='Собака спала у двери, а кот смотрел в окно',
+            author=cls.user,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def found(self, query):
+        response = self.client.get(reverse(POST_SEARCH), {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_stem_word_forms(self):
+        """Проверяем, что формы одного слова сводятся к одной основе."""
+        for forms in (
+            ('кот', 'коты', 'котами', 'кота'),
+            ('читать', 'читала', 'читали'),
+            ('подоконник', 'подоконнике', 'подоконниками'),
+        ):
+            with self.subTest(forms=forms):
+                self.assertEqual(len({search.stem(word) for word in forms}), 1)
+
+    def test_search_finds_word_forms(self):
+        """
+        Проверяем, что поиск находит посты по другой форме слова
+        и требует совпадения всех слов запроса.
+        """
+        self.assertEqual(set(self.found('котами')), {self.cats, self.dogs})
+        self.assertEqual(self.found('кот подоконник'), [self.cats])
+        self.assertEqual(self.found('кот самолёт'), [])
+        self.assertEqual(self.found(''), [])
+
+    def test_index_follows_edit_and_delete(self):
+        """Проверяем, что индекс обновляется при правке и удалении поста."""
+        dogs = Post.objects.get(pk=self.dogs.pk)
+        dogs.text = 'Собака спала у двери'
+        dogs.save()
+        self.assertEqual(self.found('кот'), [self.cats])
+        Post.objects.get(pk=self.cats.pk).delete()
+        self.assertEqual(self.found('кот'), [])
+
+    def test_inverted_index_without_fts5(self):
+        """Проверяем поиск по таблице PostTerm, когда FTS5 недоступен."""
+        with mock.patch.object(search, 'use_fts5', return_value=False):
+            self.assertEqual(search.rebuild_index(), 2)
+            self.assertTrue(PostTerm.objects.filter(post=self.cats).exists())
+            self.assertEqual(self.found('коты подоконниками'), [self.cats])
+            self.assertEqual(self.found('двери'), [self.dogs])
+
+    def test_inverted_index_takes_total_from_cache(self):
+        """Проверяем, что число постов для idf берётся из кеша ленты."""
+        with mock.patch.object(search, 'use_fts5', return_value=False):
+            search.rebuild_index()
+            search.search_ids('кот')
+            with self.assertNumQueries(2):
+                self.assertCountEqual(
+                    search.search_ids('кот'), [self.cats.pk, self.dogs.pk]
+                )
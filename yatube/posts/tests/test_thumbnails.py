@@ -0,0 +1,149 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .. import thumbnails
+from ..models import ImageVariant, Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+INDEX = 'posts:index'
+POST_DETAIL = 'posts:post_detail'
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+User = get_user_model()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_QUEUE_MODE='sync')
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=cls.user,
+            image=SimpleUploadedFile(
+                name='small.gif',
+                content=SMALL_GIF,
+                content_type='image/gif'
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_pages_do_not_generate_thumbnails(self):
+        """
+        Проверяем, что страницы только ищут готовую миниатюру,
+        а после её создания показывают её вместо оригинала.
+        """
+        name = self.post.image.name
+        detail = reverse(POST_DETAIL, kwargs={'post_id': self.post.pk})
+        for url in (reverse(INDEX), detail):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, self.post.image.url)
+        self.assertIsNone(thumbnails.lookup(name))
+        thumbnails.submit(name)
+        thumbnail = thumbnails.lookup(name)
+        self.assertIsNotNone(thumbnail)
+        for url in (reverse(INDEX), detail):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), thumbnail.url)
+
+    def test_page_thumbnails_are_fetched_in_one_query(self):
+        """
+        Проверяем, что миниатюры всех карточек страницы читаются
+        из KV-хранилища одним запросом.
+        """
+        posts = [self.post] + [
+            Post.objects.create(
+                text=f'Ещё пост с картинкой {i}',
+                author=self.user,
+                image=SimpleUploadedFile(
+                    name=f'small_{i}.gif',
+                    content=SMALL_GIF,
+                    content_type='image/gif'
+                ),
+            )
+            for i in range(3)
+        ]
+        for post in posts:
+            thumbnails.submit(post.image.name)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(INDEX))
+        kv_queries = [
+            query for query in queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kv_queries), 1)
+        for post in posts:
+            with self.subTest(post=post.pk):
+                self.assertContains(
+                    response,
+                    thumbnails.lookup(post.image.name).url
+                )
+
+    def test_variants_are_built_with_content_hashed_names(self):
+        """
+        Проверяем, что после загрузки создаются варианты картинки
+        с именами по хешу содержимого и попадают в srcset карточки.
+        """
+        twin = Post.objects.create(
+            text='Та же картинка',
+            author=self.user,
+            image=SimpleUploadedFile(
+                name='twin.gif',
+                content=SMALL_GIF,
+                content_type='image/gif'
+            ),
+        )
+        thumbnails.submit(self.post.image.name)
+        thumbnails.submit(twin.image.name)
+        variants = ImageVariant.objects.filter(source=self.post.image.name)
+        twin_variants = ImageVariant.objects.filter(source=twin.image.name)
+        self.assertTrue(variants.filter(mime_type='image/webp').exists())
+        self.assertEqual(
+            set(variants.values_list('file', flat=True)),
+            set(twin_variants.values_list('file', flat=True))
+        )
+        response = self.client.get(reverse(INDEX))
+        self.assertContains(response, 'type="image/webp"')
+        for variant in variants:
+            with self.subTest(variant=variant.file.name):
+                self.assertContains(
+                    response,
+                    f'{variant.file.url} {variant.width}w'
+                )
+
+    def test_pregenerate_command(self):
+        """Проверяем, что команда создаёт недостающие миниатюры."""
+        out = StringIO()
+        call_command('pregenerate_thumbnails', '--workers=1', stdout=out)
+        self.assertIn('Обработано картинок: 1', out.getvalue())
+        self.assertIsNotNone(thumbnails.lookup(self.post.image.name))
@@ -0,0 +1,109 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from .. import timeline
+from ..models import Post, Follow, TimelineEntry
+
+FOLLOW_INDEX = 'posts:follow_index'
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.old_post = Post.objects.create(
+            text='Пост до подписки',
+            author=cls.author,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_follow_fills_timeline(self):
+        """
+        Проверяем, что подписка добавляет в ленту старые посты автора,
+        а новые посты раскладываются по лентам подписчиков.
+        """
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(
+            set(self.user.timeline.values_list('post_id', flat=True)),
+            {self.old_post.pk, new_post.pk}
+        )
+        response = self.authorized_client.get(reverse(FOLLOW_INDEX))
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [new_post, self.old_post]
+        )
+
+    def test_unfollow_and_delete_trim_timeline(self):
+        """
+        Проверяем, что отписка и удаление поста убирают записи из ленты.
+        """
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='Удаляемый пост', author=self.author)
+        post.delete()
+        self.assertFalse(TimelineEntry.objects.filter(post_id=post.pk))
+        follow.delete()
+        self.assertFalse(self.user.timeline.exists())
+
+    def test_popular_author_is_read_on_demand(self):
+        """
+        Проверяем, что посты популярного автора не раскладываются
+        по лентам, но видны в ленте подписок.
+        """
+        with mock.patch.object(timeline, 'FANOUT_MAX_FOLLOWERS', 0):
+            Follow.objects.create(user=self.user, author=self.author)
+            cache.clear()
+            post = Post.objects.create(text='Пост звезды', author=self.author)
+            self.assertFalse(TimelineEntry.objects.filter(post=post))
+            response = self.authorized_client.get(reverse(FOLLOW_INDEX))
+        self.assertIn(post, response.context['page_obj'])
+
+    def test_author_leaving_pull_set_returns_to_timelines(self):
+        """
+        Проверяем, что посты автора, который перестал быть популярным,
+        попадают в ленты оставшихся подписчиков.
+        """
+        other = User.objects.create_user(username='other')
+        with mock.patch.object(timeline, 'FANOUT_MAX_FOLLOWERS', 1):
+            Follow.objects.create(user=self.user, author=self.author)
+            follow = Follow.objects.create(user=other, author=self.author)
+            cache.clear()
+            post = Post.objects.create(text='Пост звезды', author=self.author)
+            self.assertFalse(TimelineEntry.objects.filter(post=post))
+            follow.delete()
+            self.assertTrue(self.user.timeline.filter(post=post).exists())
+            response = self.authorized_client.get(reverse(FOLLOW_INDEX))
+        self.assertIn(post, response.context['page_obj'])
+
+    def test_trim_keeps_latest_entries(self):
+        """
+        Проверяем, что лента подрезается, как только в ней становится
+        больше TIMELINE_LENGTH записей, и в ней остаются самые новые посты.
+        """
+        authors = [self.author] + [
+            User.objects.create_user(username=f'author_{number}')
+            for number in range(2)
+        ]
+        for author in authors:
+            Follow.objects.create(user=self.user, author=author)
+        with mock.patch.object(timeline, 'TIMELINE_LENGTH', 2):
+            posts = [
+                Post.objects.create(text=f'Пост {number}', author=author)
+                for number, author in enumerate(authors)
+            ]
+        self.assertEqual(
+            set(self.user.timeline.values_list('post_id', flat=True)),
+            {posts[1].pk, posts[2].pk}
+        )
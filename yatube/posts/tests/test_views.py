@@ -7,15 +7,19 @@ from django.urls import reverse
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from ..forms import PostForm, CommentForm
 from ..models import Group, Post, Comment, Follow
+from ..paginator import LAST, CursorPaginator, encode_cursor
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 NUM_OF_TEST_POSTS = 12
 NUM_OF_SHOWING_POSTS = 10
 NUM_OF_POSTS_ON_PAGE_TWO = 2
+NUM_OF_LAST_PAGE_TEST_POSTS = 23
 INDEX = 'posts:index'
 GROUP_LIST = 'posts:group_list'
 PROFILE = 'posts:profile'
@@ -25,6 +29,8 @@ POST_EDIT = 'posts:post_edit'
 FOLLOW_INDEX = 'posts:follow_index'
 FOLLOW = 'posts:profile_follow'
 UNFOLLOW = 'posts:profile_unfollow'
+POST_COMMENTS = 'posts:post_comments'
+NUM_OF_SHOWING_COMMENTS = 20
 
 
 User = get_user_model()
@@ -217,19 +223,50 @@ class PostsViewsTests(TestCase):
                 self.assertNotContains(response, self.post)
 
     def test_index_cache(self):
+        """
+        Проверяем, что главная страница берётся из кеша,
+        а удаление поста сразу сбрасывает его.
+        """
         cache.clear()
         post = Post.objects.create(
             text='Тестовый пост для проверки кеша',
             author=self.author,
         )
         response = self.guest_client.get(reverse(INDEX))
-        self.assertContains(response, post)
+        self.assertContains(response, post.text)
+        Post.objects.filter(pk=post.pk).update(text='Правка мимо сигналов')
+        response = self.guest_client.get(reverse(INDEX))
+        self.assertContains(response, post.text)
         post.delete()
         response = self.guest_client.get(reverse(INDEX))
-        self.assertContains(response, post)
+        self.assertNotContains(response, post.text)
+
+    def test_post_cards_are_cached_until_change(self):
+        """
+        Проверяем, что карточка поста берётся из кеша
+        и перерисовывается после изменения поста или группы.
+        """
         cache.clear()
-        response = self.guest_client.get(reverse(INDEX))
-        self.assertNotContains(response, post)
+        post = Post.objects.create(
+            text='Карточка в кеше',
+            author=self.author,
+            group=self.group_2,
+        )
+        profile_url = reverse(
+            PROFILE, kwargs={'username': self.author.username}
+        )
+        self.guest_client.get(profile_url)
+        Post.objects.filter(pk=post.pk).update(text='Тихая правка')
+        response = self.guest_client.get(profile_url)
+        self.assertContains(response, 'Карточка в кеше')
+        post.text = 'Новый текст'
+        post.save()
+        response = self.guest_client.get(profile_url)
+        self.assertContains(response, 'Новый текст')
+        self.group_2.title = 'Переименованная группа'
+        self.group_2.save()
+        response = self.guest_client.get(profile_url)
+        self.assertContains(response, 'Группа: Переименованная группа')
 
     def test_follow(self):
         """
@@ -321,3 +358,184 @@ class PaginatorViewsTest(TestCase):
             len(response.context['page_obj']),
             NUM_OF_POSTS_ON_PAGE_TWO
         )
+
+    def test_cursor_pages(self):
+        """
+        Проверяем переход по курсорам вперёд и назад без подсчёта записей.
+        """
+        first_page = self.authorized_client.get(reverse(INDEX))
+        next_cursor = first_page.context['page_obj'].next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            second_page = self.authorized_client.get(
+                reverse(INDEX), {'cursor': next_cursor}
+            )
+        page_obj = second_page.context['page_obj']
+        self.assertEqual(page_obj.number, 2)
+        self.assertEqual(len(page_obj), NUM_OF_POSTS_ON_PAGE_TWO)
+        self.assertFalse(page_obj.has_next())
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries.captured_queries)
+        )
+        previous_page = self.authorized_client.get(
+            reverse(INDEX), {'cursor': page_obj.previous_cursor}
+        )
+        self.assertEqual(
+            list(previous_page.context['page_obj']),
+            list(first_page.context['page_obj'])
+        )
+
+    def test_broken_cursor_shows_first_page(self):
+        """Проверяем, что битый курсор ведёт на первую страницу."""
+        response = self.authorized_client.get(
+            reverse(INDEX), {'cursor': 'broken'}
+        )
+        self.assertEqual(response.context['page_obj'].number, 1)
+        self.assertEqual(
+            len(response.context['page_obj']),
+            NUM_OF_SHOWING_POSTS
+        )
+
+    def test_feed_total_is_cached_and_maintained(self):
+        """
+        Проверяем, что количество постов берётся из кеша
+        и обновляется при создании поста.
+        """
+        cache.clear()
+        self.authorized_client.get(reverse(INDEX))
+        Post.objects.create(text='Ещё один пост', author=self.author)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(reverse(INDEX))
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries.captured_queries)
+        )
+        paginator = response.context['page_obj'].paginator
+        self.assertEqual(paginator.count, NUM_OF_TEST_POSTS + 1)
+        self.assertEqual(
+            [link.number for link in paginator.page_links],
+            [1, 2]
+        )
+
+    def test_follow_total_follows_author_posts(self):
+        """
+        Проверяем, что число постов ленты подписок из кеша меняется,
+        когда автор публикует и удаляет посты.
+        """
+        cache.clear()
+        self.authorized_client.get(reverse(FOLLOW_INDEX))
+        new_posts = [
+            Post.objects.create(text='Новый пост', author=self.author)
+            for _ in range(NUM_OF_TEST_POSTS)
+        ]
+        response = self.authorized_client.get(reverse(FOLLOW_INDEX))
+        paginator = response.context['page_obj'].paginator
+        self.assertEqual(paginator.count, 2 * NUM_OF_TEST_POSTS)
+        self.assertEqual(paginator.num_pages, 3)
+        for post in new_posts:
+            post.delete()
+        response = self.authorized_client.get(reverse(FOLLOW_INDEX))
+        paginator = response.context['page_obj'].paginator
+        self.assertEqual(paginator.count, NUM_OF_TEST_POSTS)
+        self.assertEqual(paginator.num_pages, 2)
+
+
+class LastPageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=author)
+            for number in range(NUM_OF_LAST_PAGE_TEST_POSTS)
+        )
+
+    def test_last_page_holds_remainder(self):
+        """
+        Проверяем, что последняя страница по курсору содержит остаток
+        записей и не пересекается с предыдущей.
+        """
+        paginator = CursorPaginator(
+            Post.objects.all(),
+            NUM_OF_SHOWING_POSTS,
+            count_total=lambda: NUM_OF_LAST_PAGE_TEST_POSTS
+        )
+        posts = list(Post.objects.order_by('-pub_date', '-pk'))
+        last_page = paginator.get_page(cursor=encode_cursor(3, LAST))
+        self.assertEqual(last_page.number, 3)
+        self.assertEqual(list(last_page), posts[20:])
+        previous_page = paginator.get_page(cursor=last_page.previous_cursor)
+        self.assertEqual(previous_page.number, 2)
+        self.assertEqual(list(previous_page), posts[10:20])
+        first_page = paginator.get_page(
+            cursor=previous_page.previous_cursor
+        )
+        self.assertEqual(list(first_page), posts[:10])
+
+
+class CommentsPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.client_author = Client()
+        cls.client_author.force_login(cls.author)
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.author)
+        cls.busy_post = Post.objects.create(
+            text='Обсуждаемый пост',
+            author=cls.author
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.author, text='Комментарий'
+        )
+        commenters = [
+            User.objects.create_user(username=f'commenter_{i}')
+            for i in range(NUM_OF_SHOWING_COMMENTS + 5)
+        ]
+        for commenter in commenters:
+            Comment.objects.create(
+                post=cls.busy_post,
+                author=commenter,
+                text=f'Комментарий {commenter.username}'
+            )
+
+    def test_post_detail_queries_do_not_depend_on_comments(self):
+        """
+        Проверяем, что число запросов страницы поста не растёт
+        вместе с числом комментариев и их авторов.
+        """
+        cache.clear()
+        self.client_author.get(reverse(
+            POST_DETAIL, kwargs={'post_id': self.post.pk}))
+        self.client_author.get(reverse(
+            POST_DETAIL, kwargs={'post_id': self.busy_post.pk}))
+        with CaptureQueriesContext(connection) as quiet:
+            self.client_author.get(reverse(
+                POST_DETAIL, kwargs={'post_id': self.post.pk}))
+        with CaptureQueriesContext(connection) as busy:
+            response = self.client_author.get(reverse(
+                POST_DETAIL, kwargs={'post_id': self.busy_post.pk}))
+        self.assertEqual(len(busy), len(quiet))
+        self.assertEqual(
+            len(response.context['comments']),
+            NUM_OF_SHOWING_COMMENTS
+        )
+
+    def test_comments_fragment_continues_from_cursor(self):
+        """
+        Проверяем, что фрагмент по курсору отдаёт следующие комментарии
+        без повторов.
+        """
+        response = self.client_author.get(reverse(
+            POST_DETAIL, kwargs={'post_id': self.busy_post.pk}))
+        first_page = response.context['comments']
+        fragment = self.client_author.get(
+            reverse(POST_COMMENTS, kwargs={'post_id': self.busy_post.pk}),
+            {'cursor': first_page.next_cursor}
+        )
+        self.assertTemplateUsed(fragment, 'includes/comments.html')
+        self.assertNotContains(fragment, '<html')
+        second_page = fragment.context['comments']
+        self.assertIsNone(second_page.next_cursor)
+        self.assertEqual(
+            list(first_page) + list(second_page),
+            list(self.busy_post.comments.order_by('-created', '-pk'))
+        )
@@ -0,0 +1,201 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor
+)
+
+import django
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE,
+    KVStore as CachedDbKVStore
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core import timing
+
+from . import signals, variants
+from .models import Post
+
+POST_THUMBNAIL = '960x339'
+POST_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+# Обновление постов после готовности миниатюры: отдельный поток со своим
+# соединением с базой, а не поток запроса или служебный поток пула.
+_refresher = ThreadPoolExecutor(1)
+
+
+class PostThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который умеет только вычислять имя миниатюры."""
+
+    def thumbnail_file(self, name, geometry_string, **options):
+        """Миниатюра как ImageFile без обращения к хранилищам."""
+        source = ImageFile(name)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return ImageFile(
+            self._get_thumbnail_filename(source, geometry_string, options),
+            default.storage
+        )
+
+
+backend = PostThumbnailBackend()
+
+
+def thumbnail_file(name):
+    return backend.thumbnail_file(
+        name,
+        POST_THUMBNAIL,
+        **POST_THUMBNAIL_OPTIONS
+    )
+
+
+def lookup_many(names):
+    """
+    Готовые миниатюры картинок {имя: ImageFile}: один get_many кеша
+    KV-хранилища sorl и один запрос к базе на промахи. Отсутствие
+    миниатюры не кешируется: она может появиться в любой момент.
+    """
+    kvstore = default.kvstore
+    files = {name: thumbnail_file(name) for name in set(names) if name}
+    if not isinstance(kvstore, CachedDbKVStore):
+        found = {name: kvstore.get(file_) for name, file_ in files.items()}
+        return {name: file_ for name, file_ in found.items() if file_}
+    keys = {add_prefix(file_.key): name for name, file_ in files.items()}
+    if not keys:
+        return {}
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(
+            KVStoreModel.objects.filter(key__in=missing).values_list(
+                'key', 'value'
+            )
+        )
+        kvstore.cache.set_many(
+            found,
+            thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        values.update(found)
+    return {
+        keys[key]: deserialize_image_file(value)
+        for key, value in values.items()
+        if value != EMPTY_VALUE
+    }
+
+
+def lookup(name):
+    """Готовая миниатюра картинки поста или None."""
+    with timing.measure('thumb'):
+        return lookup_many([name]).get(name)
+
+
+def prefetch(posts):
+    """
+    Проставить постам атрибуты thumbnail и image_sources (srcset
+    вариантов) пакетными запросами на всю страницу.
+    """
+    posts = [post for post in posts if post.image]
+    names = [post.image.name for post in posts]
+    with timing.measure('thumb'):
+        found = lookup_many(names)
+        sources = variants.sources_for(names) if names else {}
+    for post in posts:
+        post.thumbnail = found.get(post.image.name)
+        post.image_sources = sources.get(post.image.name, [])
+
+
+def generate(name):
+    """Создать миниатюру и варианты картинки; выполняется в воркере пула."""
+    # В запросе замеряется только режим sync: воркеры -- вне запроса.
+    with timing.measure('thumb'):
+        default.backend.get_thumbnail(
+            name,
+            POST_THUMBNAIL,
+            **POST_THUMBNAIL_OPTIONS
+        )
+        variants.build(name)
+    return name
+
+
+def refresh_posts(name):
+    # Миниатюру мог создать другой процесс: запись об её отсутствии,
+    # закешированная здесь самим sorl, больше не верна.
+    if isinstance(default.kvstore, CachedDbKVStore):
+        default.kvstore.cache.delete(add_prefix(thumbnail_file(name).key))
+    # Карточки и страницы лент с этой картинкой были отрисованы
+    # без миниатюры: меняем версию постов и поколения их лент.
+    posts = Post.objects.filter(image=name)
+    for post in posts:
+        signals.bump_post_feeds(post)
+    posts.update(updated=timezone.now())
+
+
+def _refresh(future):
+    try:
+        refresh_posts(future.result())
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюру')
+    finally:
+        connections.close_all()
+
+
+def _finished(future):
+    _refresher.submit(_refresh, future)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = settings.THUMBNAIL_QUEUE_WORKERS
+            if settings.THUMBNAIL_QUEUE_MODE == 'thread':
+                _executor = ThreadPoolExecutor(workers)
+            else:
+                # spawn, а не fork: дочерние процессы не наследуют
+                # соединения с базой и настраивают Django заново.
+                _executor = ProcessPoolExecutor(
+                    workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=django.setup
+                )
+        return _executor
+
+
+def submit(name):
+    if settings.THUMBNAIL_QUEUE_MODE == 'sync':
+        future = Future()
+        future.set_result(generate(name))
+        refresh_posts(name)
+        return future
+    future = get_executor().submit(generate, name)
+    future.add_done_callback(_finished)
+    return future
+
+
+def schedule(post):
+    """Поставить миниатюру картинки поста в очередь после коммита."""
+    if post.image:
+        name = post.image.name
+        transaction.on_commit(lambda: submit(name))
@@ -0,0 +1,255 @@
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Q
+
+from . import feeds
+from .models import Follow, Post, TimelineEntry, UserCounters
+
+# Сколько последних постов хранится в ленте подписок одного читателя.
+TIMELINE_LENGTH = 1000
+# Посты авторов с бОльшим числом подписчиков не раскладываются по лентам,
+# а подмешиваются при чтении.
+FANOUT_MAX_FOLLOWERS = 5000
+PULL_AUTHORS_KEY = 'timeline:pull_authors'
+PULL_AUTHORS_TIMEOUT = 60 * 5
+BATCH_SIZE = 500
+
+
+def pull_author_ids():
+    """Авторы, чьи посты читаются из таблицы постов, а не из лент."""
+    author_ids = cache.get(PULL_AUTHORS_KEY)
+    if author_ids is None:
+        author_ids = frozenset(
+            UserCounters.objects.filter(
+                followers_count__gt=FANOUT_MAX_FOLLOWERS
+            ).values_list('user_id', flat=True)
+        )
+        cache.set(PULL_AUTHORS_KEY, author_ids, PULL_AUTHORS_TIMEOUT)
+    return author_ids
+
+
+def fan_out(post):
+    """
+    Разложить новый пост по лентам подписчиков автора.
+    Возвращает id читателей, в ленты которых попал пост.
+    """
+    if post.author_id in pull_author_ids():
+        return []
+    readers = list(follower_ids(post.author_id))
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in readers
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    if readers:
+        trim_overfull(post.author_id)
+    return readers
+
+
+def backfill(follow):
+    """Добавить в ленту нового подписчика последние посты автора."""
+    if follow.author_id in pull_author_ids():
+        return
+    posts = (
+        Post.objects.filter(author_id=follow.author_id)
+        .order_by('-pub_date', '-pk')
+        .values_list('pk', 'pub_date')[:TIMELINE_LENGTH]
+    )
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                user_id=follow.user_id,
+                post_id=post_id,
+                pub_date=pub_date
+            )
+            for post_id, pub_date in posts
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    trim(follow.user_id)
+
+
+def drop(follow):
+    """Убрать из ленты посты автора, от которого отписались."""
+    TimelineEntry.objects.filter(
+        user_id=follow.user_id,
+        post__author_id=follow.author_id
+    ).delete()
+
+
+def demote(author_id):
+    """
+    Если после отписки у автора осталось ровно FANOUT_MAX_FOLLOWERS
+    подписчиков, он перестал быть популярным: его посты больше не
+    подмешиваются при чтении, поэтому последние из них раскладываются
+    по лентам подписчиков одним INSERT ... SELECT.
+    """
+    if not UserCounters.objects.filter(
+        user_id=author_id,
+        followers_count=FANOUT_MAX_FOLLOWERS
+    ).exists():
+        return
+    entry = TimelineEntry._meta.db_table
+    follow = Follow._meta.db_table
+    post = Post._meta.db_table
+    ops = connection.ops
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} '
+            f'{entry} (user_id, post_id, pub_date) '
+            'SELECT f.user_id, p.id, p.pub_date'
+            f' FROM {follow} f CROSS JOIN ('
+            f'  SELECT id, pub_date FROM {post} WHERE author_id = %s'
+            '  ORDER BY pub_date DESC, id DESC LIMIT %s'
+            ' ) p WHERE f.author_id = %s '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            [author_id, TIMELINE_LENGTH, author_id]
+        )
+        trim_followers(author_id)
+    feeds.reset_totals([
+        feeds.follow_feed(user_id) for user_id in follower_ids(author_id)
+    ])
+    # Набор популярных авторов пересчитается при следующем чтении.
+    cache.delete(PULL_AUTHORS_KEY)
+
+
+def _trim(condition, params):
+    # Один DELETE для всех лент: в каждой остаются TIMELINE_LENGTH
+    # самых новых записей.
+    entry = TimelineEntry._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {entry} WHERE id IN ('
+            ' SELECT id FROM ('
+            '  SELECT id, ROW_NUMBER() OVER ('
+            '   PARTITION BY user_id ORDER BY pub_date DESC, post_id DESC'
+            '  ) AS position'
+            f'  FROM {entry} WHERE {condition}'
+            ' ) ranked WHERE position > %s'
+            ')',
+            [*params, TIMELINE_LENGTH]
+        )
+
+
+def trim(user_id):
+    """Подрезать ленту читателя до TIMELINE_LENGTH записей."""
+    _trim('user_id = %s', [user_id])
+    feeds.reset_totals([feeds.follow_feed(user_id)])
+
+
+def trim_followers(author_id):
+    """Подрезать ленты всех подписчиков автора одним запросом."""
+    _trim(
+        f'user_id IN (SELECT user_id FROM {Follow._meta.db_table}'
+        ' WHERE author_id = %s)',
+        [author_id]
+    )
+
+
+def trim_overfull(author_id):
+    """
+    Подрезать ленты тех подписчиков автора, в которых стало больше
+    TIMELINE_LENGTH записей. Возвращает id подрезанных читателей.
+    """
+    overfull = (
+        TimelineEntry.objects
+        .filter(user_id__in=follower_ids(author_id))
+        .order_by()
+        .values('user_id')
+        .annotate(entries=Count('pk'))
+        .filter(entries__gt=TIMELINE_LENGTH)
+        .values_list('user_id', flat=True)
+    )
+    user_ids = list(overfull)
+    if user_ids:
+        subquery, params = overfull.query.sql_with_params()
+        _trim(f'user_id IN ({subquery})', params)
+        feeds.reset_totals([
+            feeds.follow_feed(user_id) for user_id in user_ids
+        ])
+    return user_ids
+
+
+def feed_for(user, pulled=None):
+    """
+    Лента подписок: посты из материализованной ленты пользователя
+    плюс посты популярных авторов, которые не раскладывались при записи.
+    """
+    condition = Q(pk__in=TimelineEntry.objects.filter(
+        user=user
+    ).values('post_id'))
+    if pulled is None:
+        pulled = pulled_authors_for(user)
+    if pulled:
+        condition |= Q(author_id__in=pulled)
+    return Post.objects.filter(condition)
+
+
+def pulled_authors_for(user):
+    """Популярные авторы, на которых подписан пользователь."""
+    pulled = pull_author_ids()
+    if not pulled:
+        return []
+    return list(Follow.objects.filter(
+        user=user,
+        author_id__in=pulled
+    ).values_list('author_id', flat=True))
+
+
+def follower_ids(author_id):
+    return Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True
+    )
+
+
+def rebuild(user_ids=None):
+    """
+    Заново разложить посты по лентам подписок одним
+    INSERT ... SELECT, как это сделали бы сигналы: не больше
+    TIMELINE_LENGTH записей на читателя и без популярных авторов.
+    Нужно после массовой загрузки, которая обходит сигналы.
+    user_ids -- перестроить только ленты этих читателей, пачками
+    по BATCH_SIZE. Возвращает число записей.
+    """
+    cache.delete(PULL_AUTHORS_KEY)
+    if user_ids is None:
+        return _rebuild()
+    user_ids = sorted(set(user_ids))
+    return sum(
+        _rebuild(user_ids[start:start + BATCH_SIZE])
+        for start in range(0, len(user_ids), BATCH_SIZE)
+    )
+
+
+def _rebuild(user_ids=None):
+    entry = TimelineEntry._meta.db_table
+    follow = Follow._meta.db_table
+    post = Post._meta.db_table
+    user_counters = UserCounters._meta.db_table
+    where, only_readers, params = '', '', []
+    if user_ids is not None:
+        readers = f'user_id IN ({", ".join(["%s"] * len(user_ids))})'
+        where, only_readers = f' WHERE {readers}', f' AND f.{readers}'
+        params = list(user_ids)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {entry}{where}', params)
+        cursor.execute(
+            f'INSERT INTO {entry} (user_id, post_id, pub_date) '
+            'SELECT user_id, post_id, pub_date FROM ('
+            ' SELECT f.user_id AS user_id, p.id AS post_id,'
+            ' p.pub_date AS pub_date, ROW_NUMBER() OVER ('
+            '  PARTITION BY f.user_id ORDER BY p.pub_date DESC, p.id DESC'
+            ' ) AS position'
+            f' FROM {follow} f JOIN {post} p ON p.author_id = f.author_id'
+            ' WHERE f.author_id NOT IN ('
+            f'  SELECT user_id FROM {user_counters}'
+            '  WHERE followers_count > %s'
+            f' ){only_readers}'
+            ') ranked WHERE position <= %s',
+            [FANOUT_MAX_FOLLOWERS, *params, TIMELINE_LENGTH]
+        )
+        return cursor.rowcount
@@ -0,0 +1,135 @@
+import hashlib
+from functools import wraps
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import (
+    InMemoryUploadedFile,
+    TemporaryUploadedFile
+)
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.template.defaultfilters import filesizeformat
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image
+
+# Заголовок JPEG с EXIF и ICC-профилем укладывается в эти байты;
+# если размеры картинки не нашлись в них, файл отклоняется.
+IMAGE_HEADER_MAX_SIZE = 256 * 1024
+IMAGE_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """
+    Потоковый приём картинок без чтения файла целиком в память.
+
+    Размер файла проверяется по мере поступления, размеры картинки --
+    по первым байтам, без декодирования пикселей. Первые
+    FILE_UPLOAD_MAX_MEMORY_SIZE байт копятся в памяти, дальше файл
+    пишется на диск. Отклонённые файлы пропускаются, а причина
+    сохраняется в request.upload_errors[имя поля]. У принятого файла
+    есть атрибуты image_format, dimensions и sha256.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = BytesIO()
+        self.upload = None
+        self.header = b''
+        self.image_format = None
+        self.dimensions = None
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def error(self, message):
+        self.file.close()
+        if self.upload is not None:
+            self.upload.close()
+        if not hasattr(self.request, 'upload_errors'):
+            self.request.upload_errors = {}
+        self.request.upload_errors[self.field_name] = message
+
+    def reject(self, message):
+        self.error(message)
+        raise SkipFile(message)
+
+    def check_header(self):
+        try:
+            image = Image.open(BytesIO(self.header))
+        except Image.DecompressionBombError:
+            self.reject('Слишком большое разрешение картинки.')
+        except Exception:
+            # Заголовок пришёл не целиком: ждём следующих байтов.
+            if len(self.header) >= IMAGE_HEADER_MAX_SIZE:
+                self.reject('Загрузите правильное изображение.')
+            return
+        width, height = image.size
+        if image.format not in IMAGE_FORMATS:
+            self.reject('Поддерживаются картинки JPEG, PNG, GIF и WebP.')
+        if max(width, height) > settings.IMAGE_UPLOAD_MAX_SIDE or (
+            width * height > settings.IMAGE_UPLOAD_MAX_PIXELS
+        ):
+            self.reject(
+                f'Слишком большое разрешение картинки: {width}x{height}.'
+            )
+        self.image_format = image.format
+        self.dimensions = image.size
+        self.header = b''
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > settings.IMAGE_UPLOAD_MAX_SIZE:
+            self.reject(
+                'Файл больше '
+                f'{filesizeformat(settings.IMAGE_UPLOAD_MAX_SIZE)}.'
+            )
+        if self.image_format is None:
+            self.header += raw_data[:IMAGE_HEADER_MAX_SIZE]
+            self.check_header()
+        self.sha256.update(raw_data)
+        if self.upload is None and (
+            self.size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        ):
+            # Дальше копить в памяти дорого: переносим файл на диск.
+            self.upload = TemporaryUploadedFile(
+                self.file_name, self.content_type, 0, self.charset,
+                self.content_type_extra
+            )
+            self.upload.write(self.file.getvalue())
+            self.file.close()
+            self.file = self.upload.file
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if self.image_format is None:
+            # Файл короче заголовка: SkipFile здесь уже не поймают.
+            self.error('Загрузите правильное изображение.')
+            return None
+        self.file.seek(0)
+        upload = self.upload or InMemoryUploadedFile(
+            self.file, self.field_name, self.file_name, self.content_type,
+            0, self.charset, self.content_type_extra
+        )
+        upload.size = file_size
+        upload.content_type = Image.MIME[self.image_format]
+        upload.image_format = self.image_format
+        upload.dimensions = self.dimensions
+        upload.sha256 = self.sha256.hexdigest()
+        return upload
+
+
+def stream_image_uploads(view):
+    """
+    Принимать файлы запроса через ImageUploadHandler.
+
+    Обработчики можно заменить только до первого чтения request.POST,
+    а его читает CsrfViewMiddleware, поэтому проверка CSRF переносится
+    внутрь view.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [ImageUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+    return wrapper
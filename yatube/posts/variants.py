@@ -0,0 +1,105 @@
+import hashlib
+from collections import defaultdict
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .models import ImageVariant
+
+# Ширины вариантов; пропорции как у миниатюры в ленте (960x339).
+VARIANT_WIDTHS = (480, 960, 1440)
+ASPECT_RATIO = 339 / 960
+# Форматы в порядке предпочтения: браузер берёт первый <source>,
+# который поддерживает. AVIF есть не во всех сборках Pillow.
+VARIANT_FORMATS = (
+    ('AVIF', 'image/avif', 'avif', {'quality': 60}),
+    ('WEBP', 'image/webp', 'webp', {'quality': 80, 'method': 4}),
+)
+VARIANTS_DIR = 'posts/variants/'
+
+
+def available_formats():
+    Image.init()
+    return [spec for spec in VARIANT_FORMATS if spec[0] in Image.SAVE]
+
+
+def _widths(source_width):
+    return [
+        width for width in VARIANT_WIDTHS if width <= source_width
+    ] or VARIANT_WIDTHS[:1]
+
+
+def _encode(image, pil_format, options):
+    buffer = BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def _store(data, extension):
+    # Имя из хеша содержимого: одинаковые варианты хранятся один раз,
+    # а новый файл всегда получает новый URL и кешируется навечно.
+    name = (
+        f'{VARIANTS_DIR}{hashlib.sha256(data).hexdigest()[:32]}.{extension}'
+    )
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    return name
+
+
+def build(name):
+    """Создать недостающие варианты картинки; выполняется в воркере."""
+    existing = set(
+        ImageVariant.objects.filter(source=name).values_list(
+            'mime_type', 'width'
+        )
+    )
+    with default_storage.open(name) as file_:
+        image = ImageOps.exif_transpose(Image.open(file_))
+        image = image.convert('RGB')
+    variants = []
+    for width in _widths(image.width):
+        size = (width, round(width * ASPECT_RATIO))
+        resized = None
+        for pil_format, mime_type, extension, options in available_formats():
+            if (mime_type, width) in existing:
+                continue
+            if resized is None:
+                resized = ImageOps.fit(image, size, Image.LANCZOS)
+            variants.append(ImageVariant(
+                source=name,
+                file=_store(_encode(resized, pil_format, options), extension),
+                mime_type=mime_type,
+                width=size[0],
+                height=size[1],
+            ))
+    ImageVariant.objects.bulk_create(variants, ignore_conflicts=True)
+    return len(variants)
+
+
+def missing(names):
+    """Имена картинок, для которых варианты ещё не созданы."""
+    return set(names) - set(
+        ImageVariant.objects.values_list('source', flat=True).distinct()
+    )
+
+
+def sources_for(names):
+    """
+    {имя картинки: [(mime-тип, srcset)]} одним запросом. URL строятся
+    из сохранённых имён файлов, без обращения к диску.
+    """
+    srcsets = defaultdict(lambda: defaultdict(list))
+    for variant in ImageVariant.objects.filter(source__in=set(names)):
+        srcsets[variant.source][variant.mime_type].append(
+            f'{variant.file.url} {variant.width}w'
+        )
+    order = [mime_type for _, mime_type, _, _ in VARIANT_FORMATS]
+    return {
+        source: [
+            (mime_type, ', '.join(by_type[mime_type]))
+            for mime_type in order if mime_type in by_type
+        ]
+        for source, by_type in srcsets.items()
+    }
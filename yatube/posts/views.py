@@ -1,44 +1,121 @@
+from functools import partial
+
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render, redirect
 
+from core.budgets import query_budget
+from core.replicas import read_replica
+
+from . import counters, exporter, feeds, search, thumbnails, timeline
 from .forms import PostForm, CommentForm
-from .models import Group, Post, Follow
+from .models import Comment, Group, Post, Follow
+from .pagecache import cache_anonymous_page
+from .paginator import CursorPaginator
+from .uploads import stream_image_uploads
 
 NUM_OF_SHOWING_POSTS = 10
-INDEX_CACHE_UPD = 20
+NUM_OF_SHOWING_COMMENTS = 20
 
 User = get_user_model()
 
 
-def get_page_context(post_list, request):
-    paginator = Paginator(post_list, NUM_OF_SHOWING_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return {'page_obj': page_obj, }
+def get_page_context(post_list, request, feed=None, depends_on=()):
+    paginator = CursorPaginator(
+        post_list,
+        NUM_OF_SHOWING_POSTS,
+        count_total=feed and partial(feeds.get_total, feed, post_list)
+    )
+    page_obj = paginator.get_page(
+        request.GET.get('page'),
+        cursor=request.GET.get('cursor')
+    )
+    context = {'page_obj': page_obj, }
+    if feed is not None:
+        context['feed_name'] = feed
+        context['feed_version'] = feeds.get_version([feed, *depends_on])
+        context['feed_cache_timeout'] = feeds.FEED_CACHE_TIMEOUT
+    return context
+
+
+def get_comments_page(post, request):
+    """
+    Страница комментариев поста с авторами одним запросом. Листается
+    курсором, поэтому цена страницы не зависит от числа комментариев.
+    """
+    paginator = CursorPaginator(
+        Comment.objects.filter(post_id=post.pk).select_related('author'),
+        NUM_OF_SHOWING_COMMENTS,
+        date_field='created',
+        count_total=lambda: post.comments_count
+    )
+    return paginator.get_page(cursor=request.GET.get('cursor'))
+
+
+def group_page(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    return group_id and [feeds.group_feed(group_id)]
+
+
+def profile_page(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    return author_id and [
+        feeds.author_feed(author_id), feeds.profile_page(author_id)
+    ]
 
 
+def post_page(request, post_id):
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True
+    ).first()
+    return author_id and [
+        feeds.post_page(post_id), feeds.author_feed(author_id)
+    ]
+
+
+@query_budget(5)
+@read_replica
+@cache_anonymous_page(lambda request: [feeds.ALL_POSTS])
 def index(request):
     context = get_page_context(
         Post.objects.select_related('author', 'group'),
-        request
+        request,
+        feed=feeds.ALL_POSTS
     )
     return render(request, 'posts/index.html', context)
 
 
+@query_budget(5)
+@read_replica
+@cache_anonymous_page(group_page)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     group_posts_list = group.posts.select_related('author')
     context = {
         'group': group,
     }
-    context.update(get_page_context(group_posts_list, request))
+    context.update(get_page_context(
+        group_posts_list,
+        request,
+        feed=feeds.group_feed(group.pk)
+    ))
     return render(request, 'posts/group_list.html', context)
 
 
+@query_budget(5)
+@read_replica
+@cache_anonymous_page(profile_page)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('counters'),
+        username=username
+    )
     author_posts_list = author.posts.select_related('group')
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user,
@@ -46,35 +123,131 @@ def profile(request, username):
     ).exists()
     context = {
         'author': author,
+        'counters': counters.get_counters(author),
         'following': following,
     }
-    context.update(get_page_context(author_posts_list, request))
+    context.update(get_page_context(
+        author_posts_list,
+        request,
+        feed=feeds.author_feed(author.pk)
+    ))
     return render(request, 'posts/profile.html', context)
 
 
+def export_response(request, posts, name):
+    """
+    Выгрузка постов в JSONL или CSV (?format=csv), сжатая на лету
+    с ?gzip=1. Посты читаются из базы пачками по мере отправки.
+    """
+    format_ = request.GET.get('format')
+    if format_ not in exporter.FORMATS:
+        format_ = 'jsonl'
+    compress = request.GET.get('gzip') == '1'
+    response = StreamingHttpResponse(
+        exporter.export(
+            posts, format_, compress, media_url=request.build_absolute_uri
+        ),
+        content_type=(
+            'application/gzip' if compress
+            else f'{exporter.FORMATS[format_]}; charset=utf-8'
+        )
+    )
+    response['Content-Disposition'] = (
+        'attachment; '
+        f'filename="{exporter.filename(name, format_, compress)}"'
+    )
+    return response
+
+
+@query_budget(1)
+def group_export(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return export_response(request, group.posts.all(), f'group-{group.slug}')
+
+
+@query_budget(1)
+def profile_export(request, username):
+    author = get_object_or_404(User, username=username)
+    return export_response(
+        request, author.posts.all(), f'profile-{author.username}'
+    )
+
+
+@query_budget(6)
+@read_replica
+@cache_anonymous_page(post_page)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__counters', 'group'),
+        pk=post_id
+    )
+    thumbnails.prefetch([post])
     form = CommentForm()
     context = {
         'post': post,
+        'author_counters': counters.get_counters(post.author),
         'form': form,
-        'comments': post.comments.all(),
+        'comments': get_comments_page(post, request),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(4)
+@read_replica
+def post_comments(request, post_id):
+    post = get_object_or_404(
+        Post.objects.only('pk', 'comments_count'),
+        pk=post_id
+    )
+    context = {
+        'post_id': post.pk,
+        'comments': get_comments_page(post, request),
+    }
+    return render(request, 'includes/comments.html', context)
+
+
+@query_budget(4)
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = Paginator(
+        search.search_ids(query) if query else [],
+        NUM_OF_SHOWING_POSTS
+    ).get_page(request.GET.get('page'))
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        page_obj.object_list
+    )
+    page_obj.object_list = [
+        posts[post_id] for post_id in page_obj.object_list
+        if post_id in posts
+    ]
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@query_budget(10)
 @login_required
+@stream_image_uploads
 def post_create(request):
-    form = PostForm(request.POST or None, files=request.FILES or None)
+    form = PostForm(
+        request.POST or None,
+        files=request.FILES or None,
+        upload_errors=getattr(request, 'upload_errors', None)
+    )
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.schedule(post)
         return redirect('posts:profile', post.author)
     return render(request, 'posts/create_post.html', {'form': form})
 
 
+@query_budget(8)
 @login_required
+@stream_image_uploads
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if request.user != post.author:
@@ -82,10 +255,13 @@ def post_edit(request, post_id):
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
-        instance=post
+        instance=post,
+        upload_errors=getattr(request, 'upload_errors', None)
     )
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect('posts:post_detail', post.pk)
     context = {
         'form': form,
@@ -95,6 +271,7 @@ def post_edit(request, post_id):
     return render(request, 'posts/create_post.html', context)
 
 
+@query_budget(14)
 @login_required
 def post_delete(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
@@ -104,6 +281,7 @@ def post_delete(request, post_id):
     return redirect('posts:profile', post.author)
 
 
+@query_budget(7)
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
@@ -116,18 +294,24 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post.pk)
 
 
+@query_budget(7)
+@read_replica
 @login_required
 def follow_index(request):
+    pulled = timeline.pulled_authors_for(request.user)
     context = get_page_context(
-        Post.objects.select_related(
+        timeline.feed_for(request.user, pulled).select_related(
             'author',
             'group'
-        ).filter(author__following__user=request.user),
-        request
+        ),
+        request,
+        feed=feeds.follow_feed(request.user.pk),
+        depends_on=[feeds.author_feed(author_id) for author_id in pulled]
     )
     return render(request, 'posts/follow.html', context)
 
 
+@query_budget(18)
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
@@ -136,6 +320,7 @@ def profile_follow(request, username):
     return redirect('posts:profile', username)
 
 
+@query_budget(10)
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
@@ -25,7 +25,7 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 SECRET_KEY = '93+k(*$ksd992$6rx7)dyl9y6n)-98x=27*guqp7ndu+m2)2@y'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv('DEBUG', '1') == '1'
 
 ALLOWED_HOSTS = [
     'localhost',
@@ -50,10 +50,12 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
     'sorl.thumbnail',
-    'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'core.timing.ServerTimingMiddleware',
+    'core.budgets.QueryBudgetMiddleware',
+    'core.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,9 +63,14 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+# Панель отладки только в режиме отладки: в бою замеры даёт
+# core.timing.ServerTimingMiddleware.
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ] 
@@ -72,7 +79,7 @@ ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.timing.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -92,11 +99,65 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# DB_ENGINE: sqlite3 (по умолчанию) или postgresql (DB_NAME, DB_USER,
+# DB_PASSWORD, DB_HOST, DB_PORT). DB_REPLICAS -- реплики для чтения через
+# запятую: файлы для SQLite (копии основной базы, sync_replicas) или
+# хосты для PostgreSQL. Соединения живут DB_CONN_MAX_AGE секунд
+# и проверяются в начале каждого запроса (core.replicas).
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite3')
+if DB_ENGINE == 'postgresql':
+    PRIMARY_DATABASE = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('DB_NAME', 'yatube'),
+        'USER': os.getenv('DB_USER', 'yatube'),
+        'PASSWORD': os.getenv('DB_PASSWORD', ''),
+        'HOST': os.getenv('DB_HOST', '127.0.0.1'),
+        'PORT': os.getenv('DB_PORT', '5432'),
+    }
+    REPLICA_KEY = 'HOST'
+else:
+    PRIMARY_DATABASE = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.getenv('DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
     }
+    REPLICA_KEY = 'NAME'
+PRIMARY_DATABASE.update({
+    'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+    'CONN_HEALTH_CHECKS': True,
+})
+
+DATABASES = {'default': PRIMARY_DATABASE}
+DATABASE_REPLICAS = []
+for number, location in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1
+):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **PRIMARY_DATABASE,
+        REPLICA_KEY: location.strip(),
+        # В тестах реплика -- та же тестовая база.
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# После записи браузер столько секунд читает из основной базы.
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+# Недоступная реплика пропускается столько секунд.
+REPLICA_RETRY_SECONDS = 30
+
+# SQLite
+# PRAGMA для каждого нового соединения (core.sqlite). В режиме WAL
+# читатели не блокируют запись, а запись -- читателей; synchronous=normal
+# в WAL не теряет целостность при сбое процесса. busy_timeout -- сколько
+# миллисекунд ждать чужую блокировку, cache_size < 0 -- размер в КиБ.
+SQLITE_PRAGMAS = {
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'wal'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'normal'),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -64 * 1024)),
+    'temp_store': os.getenv('SQLITE_TEMP_STORE', 'memory'),
 }
 
 
@@ -137,6 +198,7 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 STATIC_URL = '/static/'
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -151,8 +213,95 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 # Cache
+# CACHE_BACKEND: locmem (по умолчанию, свой кеш у каждого процесса),
+# file или db (общие для процессов, работают без внешних сервисов),
+# redis (нужен пакет django-redis), memcached (нужен python-memcached).
+# Перед общим кешем ставится локальный LRU-кеш процесса (core.cache).
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+SHARED_CACHE_BACKENDS = {
+    'file': (
+        'django.core.cache.backends.filebased.FileBasedCache',
+        os.path.join(BASE_DIR, 'cache'),
+    ),
+    'db': ('django.core.cache.backends.db.DatabaseCache', 'yatube_cache'),
+    'redis': ('django_redis.cache.RedisCache', 'redis://127.0.0.1:6379/1'),
+    'memcached': (
+        'django.core.cache.backends.memcached.MemcachedCache',
+        '127.0.0.1:11211',
+    ),
+}
+
+# Обращения к кешу замеряет обёртка core.cache.TimedCache (Server-Timing).
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TimedCache',
+        'OPTIONS': {'CACHE': 'main'},
+    },
 }
+if CACHE_BACKEND == 'locmem':
+    CACHES.update({
+        'main': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    })
+else:
+    SHARED_CACHE, SHARED_CACHE_LOCATION = SHARED_CACHE_BACKENDS[CACHE_BACKEND]
+    CACHES.update({
+        'main': {
+            'BACKEND': 'core.cache.TieredCache',
+            'OPTIONS': {
+                'L2': 'shared',
+                'L1_MAX_ENTRIES': int(os.getenv('CACHE_L1_MAX_ENTRIES', 1000)),
+                'L1_TIMEOUT': int(os.getenv('CACHE_L1_TIMEOUT', 5)),
+                # Поколения лент, счётчики и блокировки пересчёта
+                # (core.stampede) должны быть общими для всех процессов,
+                # поэтому мимо L1.
+                'L1_BYPASS': ['feed_gen:', 'feed_count:', 'lock:'],
+            },
+        },
+        'shared': {
+            'BACKEND': SHARED_CACHE,
+            'LOCATION': os.getenv('CACHE_LOCATION', SHARED_CACHE_LOCATION),
+        },
+    })
+
+# Page cache
+# Ленты, профили и страницы постов для анонимных посетителей кешируются
+# целиком (posts.pagecache) и устаревают при смене поколений лент.
+# 0 -- не кешировать.
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# Thumbnails
+# Миниатюры картинок постов готовятся в фоне после загрузки (posts.thumbnails).
+# THUMBNAIL_QUEUE_MODE: process (пул процессов, по умолчанию), thread
+# или sync (сразу в запросе).
+THUMBNAIL_QUEUE_MODE = os.getenv('THUMBNAIL_QUEUE_MODE', 'process')
+THUMBNAIL_QUEUE_WORKERS = int(os.getenv('THUMBNAIL_QUEUE_WORKERS', 2))
+
+# Uploads
+# Ограничения для картинок постов (posts.uploads.ImageUploadHandler).
+# Файл больше FILE_UPLOAD_MAX_MEMORY_SIZE копится на диске, а не в памяти.
+IMAGE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+IMAGE_UPLOAD_MAX_SIDE = 10000
+IMAGE_UPLOAD_MAX_PIXELS = 40 * 1000 * 1000
+
+# Assets
+# SERVE_ASSETS=1 -- боевой режим без отдельного веб-сервера: collectstatic
+# собирает статику с хешем в именах и готовыми .gz/.br копиями
+# (core.storage), а core.assets отдаёт её и медиа с ETag и долгим кешем.
+SERVE_ASSETS = os.getenv('SERVE_ASSETS') == '1'
+if SERVE_ASSETS:
+    STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+
+# Query budgets
+# Число SQL-запросов view ограничено декоратором core.budgets.query_budget.
+# Превышение пишется в лог, а при QUERY_BUDGET_RAISE=1 -- ошибка.
+QUERY_BUDGET_RAISE = os.getenv('QUERY_BUDGET_RAISE') == '1'
+
+# Server timing
+# У каждого ответа есть заголовок Server-Timing с общим временем и временем
+# SQL. Доля SERVER_TIMING_SAMPLE_RATE запросов замеряется подробно (шаблоны,
+# кеш, миниатюры), пишется в лог core.timing и в гистограммы по view.
+SERVER_TIMING_SAMPLE_RATE = float(
+    os.getenv('SERVER_TIMING_SAMPLE_RATE', 0.01)
+)
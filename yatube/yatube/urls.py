@@ -14,10 +14,12 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core import assets
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -31,10 +33,23 @@ handler404 = 'core.views.page_not_found'
 handler500 = 'core.views.server_error'
 handler403 = 'core.views.permission_denied'
 
-if settings.DEBUG:
-    import debug_toolbar
-
+if settings.SERVE_ASSETS:
+    urlpatterns += [
+        re_path(
+            r'^%s(?P<path>.+)$' % settings.STATIC_URL.lstrip('/'),
+            assets.serve_static
+        ),
+        re_path(
+            r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'),
+            assets.serve_media
+        ),
+    ]
+elif settings.DEBUG:
     urlpatterns += static(
         settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
     )
+
+if settings.DEBUG:
+    import debug_toolbar
+
     urlpatterns += (path('__debug__/', include(debug_toolbar.urls)),)